@@ -3,12 +3,25 @@ from .router import RouterAgent
 from .ticket_agent import TicketAgent
 from .event_agent import EventAgent
 from .account_agent import AccountAgent
-from .faq_agent import FAQAgent
+from .faq_agent import FAQAgent, FAQ_CACHE, FAQ_FALLBACK
+from .ticket_agent import TICKET_KEYWORDS, TICKET_FALLBACK
+from .event_agent import EVENT_CACHE, EVENTS_INFO
+from .account_agent import ACCOUNT_CACHE, ACCOUNT_FALLBACK
+
+
+def cached_responses():
+    """Every fixed answer an agent can yield whole, as (agent_type, text)"""
+    yield from (("faq", text) for text in [*FAQ_CACHE.values(), FAQ_FALLBACK])
+    yield from (("ticket", text) for text in [*(t for _, t in TICKET_KEYWORDS), TICKET_FALLBACK])
+    yield from (("event", text) for text in [*EVENT_CACHE.values(), EVENTS_INFO])
+    yield from (("account", text) for text in [*ACCOUNT_CACHE.values(), ACCOUNT_FALLBACK])
+
 
 __all__ = [
     "RouterAgent",
     "TicketAgent", 
     "EventAgent",
     "AccountAgent",
-    "FAQAgent"
+    "FAQAgent",
+    "cached_responses"
 ]
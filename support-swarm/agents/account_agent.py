@@ -1,11 +1,15 @@
 # Account Agent - Hybrid: Cache → RAG → LLM
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
 from typing import List, Dict, AsyncGenerator
-import os
+
+from metrics import track_ttft, count_answer, count_error
+from deadline import within, RETRIEVAL_TIMEOUT_SECONDS, SEMANTIC_CACHE_TIMEOUT_SECONDS
+from llm_gateway import gateway, STREAM_INTERRUPTED
+from .matcher import MATCHER
 
 try:
-    from vector_store import get_vector_store
+    from vector_store import get_ready_vector_store
+    from semantic_cache import get_semantic_cache
+    from extractive import extractive_answer
     RAG_AVAILABLE = True
 except ImportError:
     RAG_AVAILABLE = False
@@ -41,63 +45,84 @@ Your data stays private!""",
 }
 
 
+ACCOUNT_FALLBACK = "Check Dashboard → Settings or email support@fanfirst.com"
+
+MATCHER.add_table("account", list(ACCOUNT_CACHE.items()))
+
+
 def find_account_cache(message: str) -> str | None:
-    msg_lower = message.lower()
-    for key in ACCOUNT_CACHE:
-        if key in msg_lower:
-            return ACCOUNT_CACHE[key]
-    return None
+    return MATCHER.scan(message).first("account")
 
 
 class AccountAgent:
     def __init__(self):
-        self._llm = None
         self._vector_store = None
-    
-    @property
-    def llm(self):
-        if self._llm is None:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if api_key:
-                try:
-                    self._llm = ChatGoogleGenerativeAI(
-                        model="gemini-1.5-flash",
-                        google_api_key=api_key,
-                        temperature=0.7,
-                        streaming=True,
-                    )
-                except: pass
-        return self._llm
+        self._semantic_cache = None
     
     @property
     def vector_store(self):
         if self._vector_store is None and RAG_AVAILABLE:
             try:
-                self._vector_store = get_vector_store()
-            except: pass
+                self._vector_store = get_ready_vector_store()
+            except Exception: pass
         return self._vector_store
     
+    @property
+    def semantic_cache(self):
+        if self._semantic_cache is None and RAG_AVAILABLE:
+            try:
+                self._semantic_cache = get_semantic_cache()
+            except Exception: pass
+        return self._semantic_cache
+    
     async def stream_response(
         self, 
         message: str, 
         history: List[Dict], 
         db=None,
-        user_id: str = None
+        user_id: str = None,
+        retrieval=None
     ) -> AsyncGenerator[str, None]:
         
         cached = find_account_cache(message)
         if cached:
-            for i in range(0, len(cached), 20):
-                yield cached[i:i+20]
+            count_answer("account", "exact_cache")
+            yield cached
             return
         
+        if self.semantic_cache:
+            try:
+                cached = await within(
+                    self.semantic_cache.alookup("account", message),
+                    "semantic_cache", SEMANTIC_CACHE_TIMEOUT_SECONDS,
+                )
+            except Exception:
+                count_error("semantic_cache")
+            if cached:
+                count_answer("account", "semantic_cache")
+                yield cached
+                return
+        
         context = ""
-        if self.vector_store:
+        passages = None
+        if retrieval or self.vector_store:
             try:
-                context = self.vector_store.get_context(message)
-            except: pass
+                passages, context = await within(
+                    retrieval.get() if retrieval else self.vector_store.aget_passages(message),
+                    "retrieval", RETRIEVAL_TIMEOUT_SECONDS,
+                )
+            except Exception:
+                count_error("retrieval")
         
-        if self.llm:
+        if RAG_AVAILABLE:
+            extracted = await extractive_answer("account", message, passages, confident_only=True)
+            if extracted:
+                count_answer("account", "extractive")
+                yield extracted
+                return
+        
+        if gateway.available:
+            answer = ""
             try:
                 prompt = f"""You are Account Support for FanFirst.
 {f'Context: {context}' if context else ''}
@@ -106,11 +131,30 @@ User: {message}
 
 Brief reply:"""
                 
-                async for chunk in self.llm.astream([HumanMessage(content=prompt)]):
-                    if chunk.content:
-                        yield chunk.content
+                async for text in track_ttft("account", gateway.astream(prompt)):
+                    answer += text
+                    yield text
+            except Exception:
+                count_error("llm")
+                if answer:
+                    # Output has started - end this reply, never append a fallback to it
+                    count_answer("account", "llm_partial")
+                    yield STREAM_INTERRUPTED
+                    return
+            else:
+                if self.semantic_cache:
+                    try:
+                        await self.semantic_cache.astore("account", message, answer)
+                    except Exception:
+                        count_error("semantic_cache")
+                count_answer("account", "llm")
                 return
-            except: pass
         
-        fallback = "Check Dashboard → Settings or email support@fanfirst.com"
-        yield fallback
+        if RAG_AVAILABLE:
+            extracted = await extractive_answer("account", message, passages)
+            if extracted:
+                count_answer("account", "extractive")
+                yield extracted
+                return
+        count_answer("account", "fallback")
+        yield ACCOUNT_FALLBACK
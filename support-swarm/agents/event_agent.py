@@ -1,11 +1,15 @@
 # Event Agent - Hybrid: Cache → RAG → LLM
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
 from typing import List, Dict, AsyncGenerator
-import os
+
+from metrics import track_ttft, count_answer, count_error
+from deadline import within, RETRIEVAL_TIMEOUT_SECONDS, SEMANTIC_CACHE_TIMEOUT_SECONDS
+from llm_gateway import gateway, STREAM_INTERRUPTED
+from .matcher import MATCHER
 
 try:
-    from vector_store import get_vector_store
+    from vector_store import get_ready_vector_store
+    from semantic_cache import get_semantic_cache
+    from extractive import extractive_answer
     RAG_AVAILABLE = True
 except ImportError:
     RAG_AVAILABLE = False
@@ -46,57 +50,81 @@ Get tickets at /events""",
     "when": EVENTS_INFO,
 }
 
+MATCHER.add_table("event", list(EVENT_CACHE.items()))
+
+
+def find_event_cache(message: str) -> str | None:
+    return MATCHER.scan(message).first("event")
+
 
 class EventAgent:
     def __init__(self):
-        self._llm = None
         self._vector_store = None
-    
-    @property
-    def llm(self):
-        if self._llm is None:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if api_key:
-                try:
-                    self._llm = ChatGoogleGenerativeAI(
-                        model="gemini-1.5-flash",
-                        google_api_key=api_key,
-                        temperature=0.7,
-                        streaming=True,
-                    )
-                except: pass
-        return self._llm
+        self._semantic_cache = None
     
     @property
     def vector_store(self):
         if self._vector_store is None and RAG_AVAILABLE:
             try:
-                self._vector_store = get_vector_store()
-            except: pass
+                self._vector_store = get_ready_vector_store()
+            except Exception: pass
         return self._vector_store
     
+    @property
+    def semantic_cache(self):
+        if self._semantic_cache is None and RAG_AVAILABLE:
+            try:
+                self._semantic_cache = get_semantic_cache()
+            except Exception: pass
+        return self._semantic_cache
+    
     async def stream_response(
         self, 
         message: str, 
         history: List[Dict], 
-        db=None
+        db=None,
+        retrieval=None
     ) -> AsyncGenerator[str, None]:
         
-        msg_lower = message.lower()
-        for key in EVENT_CACHE:
-            if key in msg_lower:
-                cached = EVENT_CACHE[key]
-                for i in range(0, len(cached), 20):
-                    yield cached[i:i+20]
+        cached = find_event_cache(message)
+        if cached:
+            count_answer("event", "exact_cache")
+            yield cached
+            return
+        
+        if self.semantic_cache:
+            try:
+                cached = await within(
+                    self.semantic_cache.alookup("event", message),
+                    "semantic_cache", SEMANTIC_CACHE_TIMEOUT_SECONDS,
+                )
+            except Exception:
+                count_error("semantic_cache")
+            if cached:
+                count_answer("event", "semantic_cache")
+                yield cached
                 return
         
         context = ""
-        if self.vector_store:
+        passages = None
+        if retrieval or self.vector_store:
             try:
-                context = self.vector_store.get_context(message)
-            except: pass
+                passages, context = await within(
+                    retrieval.get() if retrieval else self.vector_store.aget_passages(message),
+                    "retrieval", RETRIEVAL_TIMEOUT_SECONDS,
+                )
+            except Exception:
+                count_error("retrieval")
         
-        if self.llm:
+        if RAG_AVAILABLE:
+            extracted = await extractive_answer("event", message, passages, confident_only=True)
+            if extracted:
+                count_answer("event", "extractive")
+                yield extracted
+                return
+        
+        if gateway.available:
+            answer = ""
             try:
                 prompt = f"""You are Event Info for FanFirst.
 {f'Context: {context}' if context else ''}
@@ -106,11 +134,30 @@ User: {message}
 
 Brief reply:"""
                 
-                async for chunk in self.llm.astream([HumanMessage(content=prompt)]):
-                    if chunk.content:
-                        yield chunk.content
+                async for text in track_ttft("event", gateway.astream(prompt)):
+                    answer += text
+                    yield text
+            except Exception:
+                count_error("llm")
+                if answer:
+                    # Output has started - end this reply, never append a fallback to it
+                    count_answer("event", "llm_partial")
+                    yield STREAM_INTERRUPTED
+                    return
+            else:
+                if self.semantic_cache:
+                    try:
+                        await self.semantic_cache.astore("event", message, answer)
+                    except Exception:
+                        count_error("semantic_cache")
+                count_answer("event", "llm")
                 return
-            except: pass
         
-        for i in range(0, len(EVENTS_INFO), 20):
-            yield EVENTS_INFO[i:i+20]
+        if RAG_AVAILABLE:
+            extracted = await extractive_answer("event", message, passages)
+            if extracted:
+                count_answer("event", "extractive")
+                yield extracted
+                return
+        count_answer("event", "fallback")
+        yield EVENTS_INFO
@@ -1,23 +1,20 @@
 # FAQ Agent - Direct Google GenAI (no LangChain)
-import os
 from typing import List, Dict, AsyncGenerator
-import asyncio
+
+from metrics import track_ttft, count_answer, count_error
+from deadline import within, RETRIEVAL_TIMEOUT_SECONDS, SEMANTIC_CACHE_TIMEOUT_SECONDS
+from llm_gateway import gateway, GENAI_AVAILABLE, STREAM_INTERRUPTED
+from .matcher import MATCHER
 
 # Try to import RAG
 try:
-    from vector_store import get_vector_store
+    from vector_store import get_ready_vector_store
+    from semantic_cache import get_semantic_cache
+    from extractive import extractive_answer
     RAG_AVAILABLE = True
 except ImportError:
     RAG_AVAILABLE = False
 
-# Try direct Google Gen AI
-try:
-    import google.generativeai as genai
-    GENAI_AVAILABLE = True
-except ImportError:
-    GENAI_AVAILABLE = False
-    print("[FAQAgent] google-generativeai not available")
-
 # Quick cache
 FAQ_CACHE: Dict[str, str] = {
     "what is fanfirst": """🎫 **FanFirst** is an AI-powered NFT ticketing platform that ensures real fans get access to tickets before scalpers and bots.
@@ -94,69 +91,105 @@ Just ask your question!""",
 }
 
 
+FAQ_FALLBACK = """❓ I couldn't find specific info for that question.
+
+Try asking about:
+- What is FanFirst?
+- How does FanFirst work?
+- Difference from Ticketmaster
+
+Or email support@fanfirst.com"""
+
+MATCHER.add_table("faq", list(FAQ_CACHE.items()))
+
+
 def find_cached_response(message: str) -> str | None:
-    msg_lower = message.lower()
-    for key in FAQ_CACHE:
-        if key in msg_lower:
-            return FAQ_CACHE[key]
-    return None
+    return MATCHER.scan(message).first("faq")
 
 
 class FAQAgent:
     """FAQ with Cache → RAG → Direct GenAI"""
     
     def __init__(self):
-        self._model = None
         self._vector_store = None
-    
-    @property
-    def model(self):
-        if self._model is None and GENAI_AVAILABLE:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if api_key:
-                try:
-                    genai.configure(api_key=api_key)
-                    self._model = genai.GenerativeModel('gemini-2.0-flash')
-                    print("[FAQAgent] Gemini model initialized ✓")
-                except Exception as e:
-                    print(f"[FAQAgent] Model init failed: {e}")
-        return self._model
+        self._semantic_cache = None
     
     @property
     def vector_store(self):
         if self._vector_store is None and RAG_AVAILABLE:
             try:
-                self._vector_store = get_vector_store()
+                self._vector_store = get_ready_vector_store()
             except Exception as e:
                 print(f"[FAQAgent] Vector store init failed: {e}")
         return self._vector_store
     
+    @property
+    def semantic_cache(self):
+        if self._semantic_cache is None and RAG_AVAILABLE:
+            try:
+                self._semantic_cache = get_semantic_cache()
+            except Exception as e:
+                print(f"[FAQAgent] Semantic cache init failed: {e}")
+        return self._semantic_cache
+    
     async def stream_response(
         self, 
         message: str, 
-        history: List[Dict]
+        history: List[Dict],
+        retrieval=None
     ) -> AsyncGenerator[str, None]:
         
         # LAYER 1: Check exact cache (instant, free)
         cached = find_cached_response(message)
         if cached:
             print(f"[FAQAgent] Cache hit!")
-            for i in range(0, len(cached), 25):
-                yield cached[i:i+25]
+            count_answer("faq", "exact_cache")
+            yield cached
             return
         
+        # LAYER 1b: Semantic cache (paraphrases of earlier Gemini answers)
+        if self.semantic_cache:
+            try:
+                cached = await within(
+                    self.semantic_cache.alookup("faq", message),
+                    "semantic_cache", SEMANTIC_CACHE_TIMEOUT_SECONDS,
+                )
+            except Exception as e:
+                print(f"[FAQAgent] Semantic cache error: {e}")
+                count_error("semantic_cache")
+            if cached:
+                print("[FAQAgent] Semantic cache hit!")
+                count_answer("faq", "semantic_cache")
+                yield cached
+                return
+        
         # LAYER 2: RAG search for context
         context = ""
-        if self.vector_store:
+        passages = None
+        if retrieval or self.vector_store:
             try:
-                context = self.vector_store.get_context(message)
+                passages, context = await within(
+                    retrieval.get() if retrieval else self.vector_store.aget_passages(message),
+                    "retrieval", RETRIEVAL_TIMEOUT_SECONDS,
+                )
                 if context:
                     print(f"[FAQAgent] RAG context found ({len(context)} chars)")
             except Exception as e:
                 print(f"[FAQAgent] RAG error: {e}")
+                count_error("retrieval")
+        
+        # LAYER 2b: Extractive answer, when confident enough to skip Gemini
+        if RAG_AVAILABLE:
+            extracted = await extractive_answer("faq", message, passages, confident_only=True)
+            if extracted:
+                print("[FAQAgent] Extractive answer")
+                count_answer("faq", "extractive")
+                yield extracted
+                return
         
         # LAYER 3: Direct Gemini API call
-        if self.model:
+        if gateway.available and GENAI_AVAILABLE:
+            result = ""
             try:
                 if context:
                     prompt = f"""You are FAQ support for FanFirst NFT ticketing platform.
@@ -180,31 +213,38 @@ USER: {message}
 
 Answer briefly:"""
                 
-                print(f"[FAQAgent] Calling Gemini...")
-                response = await asyncio.to_thread(
-                    self.model.generate_content, 
-                    prompt
-                )
-                result = response.text
-                print(f"[FAQAgent] Gemini response: {len(result)} chars")
+                print("[FAQAgent] Calling Gemini (streaming)...")
                 
-                # Stream in chunks
-                for i in range(0, len(result), 25):
-                    yield result[i:i+25]
-                return
+                # Forward tokens as Gemini produces them
+                async for text in track_ttft("faq", gateway.astream_genai(prompt)):
+                    result += text
+                    yield text
                 
             except Exception as e:
                 print(f"[FAQAgent] Gemini error: {e}")
+                count_error("llm")
+                if result:
+                    # Output has started - end this reply, never append a fallback to it
+                    count_answer("faq", "llm_partial")
+                    yield STREAM_INTERRUPTED
+                    return
+            else:
+                print(f"[FAQAgent] Gemini response: {len(result)} chars")
+                if self.semantic_cache:
+                    try:
+                        await self.semantic_cache.astore("faq", message, result)
+                    except Exception as e:
+                        print(f"[FAQAgent] Semantic cache store error: {e}")
+                        count_error("semantic_cache")
+                count_answer("faq", "llm")
+                return
         
-        # LAYER 4: Fallback
-        fallback = """❓ I couldn't find specific info for that question.
-
-Try asking about:
-- What is FanFirst?
-- How does FanFirst work?
-- Difference from Ticketmaster
-
-Or email support@fanfirst.com"""
-        
-        for i in range(0, len(fallback), 25):
-            yield fallback[i:i+25]
+        # LAYER 4: Extractive answer (Gemini unavailable, failing or over budget), then fallback
+        if RAG_AVAILABLE:
+            extracted = await extractive_answer("faq", message, passages)
+            if extracted:
+                count_answer("faq", "extractive")
+                yield extracted
+                return
+        count_answer("faq", "fallback")
+        yield FAQ_FALLBACK
@@ -0,0 +1,109 @@
+# Intent Classifier - local embedding routing (no LLM round trip)
+# Reuses the vector store's all-MiniLM-L6-v2 model and compares the query
+# against the centroid of a few labeled examples per agent.
+
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Below this confidence the router still asks the LLM
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.6"))
+
+# Softmax temperature over centroid similarities (lower = sharper)
+_TEMPERATURE = 0.05
+
+LABELED_EXAMPLES: Dict[str, List[str]] = {
+    "ticket": [
+        "can I get my money back",
+        "I can't go to the concert anymore, what do I do with my ticket",
+        "how do I send my ticket to a friend",
+        "where do I find the code to get into the venue",
+        "I want to sell my seat",
+        "my ticket isn't showing up",
+        "how much can I list my ticket for",
+        "I was charged twice for my order",
+    ],
+    "event": [
+        "who is playing this weekend",
+        "what games are coming up",
+        "is there a concert near me",
+        "what time does the show start",
+        "which venue is the tour at",
+        "are there any basketball games in march",
+        "what artists are touring soon",
+        "any musicals coming to LA",
+    ],
+    "account": [
+        "how do I link metamask",
+        "change my email address",
+        "I forgot my password",
+        "how do I raise my fan points",
+        "update my username",
+        "my phantom wallet won't connect",
+        "delete my account",
+        "how do I log out",
+    ],
+    "faq": [
+        "how does this platform work",
+        "why should I trust you",
+        "what makes this better than other ticket sites",
+        "is my personal data sold",
+        "what blockchain do you use",
+        "who runs this company",
+        "how do you stop scalpers",
+        "what is the quiz for",
+    ],
+}
+
+
+class IntentClassifier:
+    """Nearest-centroid classifier over sentence embeddings"""
+
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+        self.labels: List[str] = list(LABELED_EXAMPLES)
+        self._centroids = None
+
+    def _build(self):
+        centroids = []
+        for label in self.labels:
+            vectors = np.asarray(self.vector_store.embed(LABELED_EXAMPLES[label]), dtype=np.float32)
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            centroid = vectors.mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        self._centroids = np.stack(centroids)
+
+    def warm_up(self):
+        """Embed the labeled examples now rather than on the first routed turn"""
+        if self._centroids is None:
+            self._build()
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        """Return (label, confidence in 0-1) - blocking, embeds the message"""
+        self.warm_up()
+
+        query = np.asarray(self.vector_store.embed([message])[0], dtype=np.float32)
+        query = query / np.linalg.norm(query)
+        sims = self._centroids @ query
+
+        probs = np.exp((sims - sims.max()) / _TEMPERATURE)
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        return self.labels[best], float(probs[best])
+
+    async def aclassify(self, message: str) -> Tuple[str, float]:
+        """classify() on the vector store's executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.vector_store.executor, self.classify, message)
+
+
+def create_classifier(vector_store) -> Optional[IntentClassifier]:
+    if not NUMPY_AVAILABLE or vector_store is None:
+        return None
+    return IntentClassifier(vector_store)
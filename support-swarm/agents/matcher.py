@@ -0,0 +1,96 @@
+# Keyword Matcher - one shared pass for routing and every agent cache
+# Keywords are indexed as whole-word token sequences, so "vs" no longer fires
+# inside "canvas" and "show" no longer fires inside "shower". Lookup cost is a
+# few dict probes per word regardless of how large the tables grow.
+
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import re
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Inflections accepted on the last word of a keyword ("refund" → "refunds", "refunded")
+_SUFFIXES = ("s", "es", "d", "ed", "ing", "led", "ling", "lation")
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    return tuple(_WORD.findall(text.lower()))
+
+
+def _variants(words: Tuple[str, ...]) -> Iterable[Tuple[str, ...]]:
+    yield words
+    head, last = words[:-1], words[-1]
+    for suffix in _SUFFIXES:
+        yield head + (last + suffix,)
+    if last.endswith("e"):
+        yield head + (last[:-1] + "ing",)  # "purchase" → "purchasing"
+
+
+class Match:
+    """Everything one message matched, across all registered tables"""
+
+    def __init__(self, hits: Dict[str, List[Tuple[int, Any]]]):
+        self._hits = hits
+
+    def first(self, table: str) -> Optional[Any]:
+        """Highest-priority value matched in a table, honoring exclusions"""
+        candidates = self._hits.get(table)
+        if not candidates:
+            return None
+        blocked = self._hits.get(f"{table}:exclude", ())
+        blocked_values = {value for _, value in blocked}
+        for _, value in sorted(candidates, key=lambda hit: hit[0]):
+            if value not in blocked_values:
+                return value
+        return None
+
+
+class KeywordMatcher:
+    """Multi-table keyword index built once at import"""
+
+    def __init__(self):
+        # token tuple → [(table, priority, value)]
+        self._index: Dict[Tuple[str, ...], List[Tuple[str, int, Any]]] = {}
+        self._max_words = 1
+
+    def add_table(
+        self,
+        name: str,
+        entries: Iterable[Tuple[str, Any]],
+        exclusions: Dict[Any, List[str]] = None,
+    ):
+        """Register (keyword, value) pairs - list order is priority order"""
+        for priority, (keyword, value) in enumerate(entries):
+            self._add(keyword, (name, priority, value))
+
+        # Exclusions are matched like keywords and veto a value in first()
+        for value, phrases in (exclusions or {}).items():
+            for phrase in phrases:
+                self._add(phrase, (f"{name}:exclude", 0, value))
+
+        self.scan.cache_clear()
+
+    def _add(self, keyword: str, entry: Tuple[str, int, Any]):
+        words = tokenize(keyword)
+        if not words:
+            return
+        self._max_words = max(self._max_words, len(words))
+        for variant in _variants(words):
+            bucket = self._index.setdefault(variant, [])
+            if entry not in bucket:
+                bucket.append(entry)
+
+    @lru_cache(maxsize=4096)
+    def scan(self, message: str) -> Match:
+        """Single pass over the message (memoized so router + agent share it)"""
+        words = tokenize(message)
+        hits: Dict[str, List[Tuple[int, Any]]] = {}
+        for i in range(len(words)):
+            for n in range(1, min(self._max_words, len(words) - i) + 1):
+                for table, priority, value in self._index.get(words[i:i + n], ()):
+                    hits.setdefault(table, []).append((priority, value))
+        return Match(hits)
+
+
+# Shared instance - router and agents register their tables at import
+MATCHER = KeywordMatcher()
@@ -1,9 +1,18 @@
 # Router Agent - Smart routing with exclusions
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
 from typing import Literal, Tuple, Dict, List
-import os
-import re
+import time
+
+from llm_gateway import gateway
+from metrics import ROUTE_SECONDS, ROUTES_TOTAL, count_error
+from deadline import within, DeadlineExceeded, ROUTER_TIMEOUT_SECONDS
+from .matcher import MATCHER
+from .intent_classifier import ROUTER_CONFIDENCE_THRESHOLD, create_classifier
+
+try:
+    from vector_store import get_ready_vector_store
+    RAG_AVAILABLE = True
+except ImportError:
+    RAG_AVAILABLE = False
 
 AgentType = Literal["ticket", "event", "account", "faq"]
 
@@ -13,6 +22,9 @@ EXCLUSIONS: Dict[str, List[str]] = {
 }
 
 # Keyword-based routing (checked in order!)
+# Matched on whole words plus simple inflections (see matcher.py), so
+# compounds the old substring check caught are listed explicitly. Dropped on
+# purpose: "eventually"/"prevent"/"shower" (event), "scoreboard" (account)
 KEYWORD_ROUTES: List[tuple[str, AgentType]] = [
     # FAQ keywords (general questions) - check first!
     ("what is fanfirst", "faq"),
@@ -22,6 +34,10 @@ KEYWORD_ROUTES: List[tuple[str, AgentType]] = [
     ("compare", "faq"),
     ("vs", "faq"),
     ("safe", "faq"),
+    ("safety", "faq"),
+    ("safely", "faq"),
+    ("unsafe", "faq"),
+    ("safeguard", "faq"),
     ("security", "faq"),
     ("privacy", "faq"),
     ("blockchain", "faq"),
@@ -31,11 +47,17 @@ KEYWORD_ROUTES: List[tuple[str, AgentType]] = [
     # Ticket keywords
     ("refund", "ticket"),
     ("cancel", "ticket"),
+    ("refundable", "ticket"),
     ("transfer", "ticket"),
+    ("transferred", "ticket"),
+    ("transferring", "ticket"),
+    ("transferable", "ticket"),
     ("qr code", "ticket"),
     ("qr", "ticket"),
+    ("qrcode", "ticket"),
     ("resale", "ticket"),
     ("resell", "ticket"),
+    ("reseller", "ticket"),
     ("buy ticket", "ticket"),
     ("purchase", "ticket"),
     ("my ticket", "ticket"),
@@ -47,93 +69,139 @@ KEYWORD_ROUTES: List[tuple[str, AgentType]] = [
     ("concert", "event"),
     ("event", "event"),
     ("show", "event"),
+    ("showtime", "event"),
+    ("showcase", "event"),
     ("when is", "event"),
     ("upcoming", "event"),
     
     # Account keywords
     ("wallet", "account"),
     ("connect", "account"),
+    ("connection", "account"),
+    ("reconnect", "account"),
+    ("disconnect", "account"),
     ("profile", "account"),
     ("fandom score", "account"),
     ("score", "account"),
     ("spotify", "account"),
     ("login", "account"),
     ("sign in", "account"),
+    ("sign into", "account"),
 ]
 
+ROUTER_PROMPT = """Classify this query for FanFirst support.
+Reply with ONLY one word: ticket, event, account, or faq
+
+Query: {message}
+
+Answer:"""
+
+LLM_ROUTE_MESSAGES: Dict[str, str] = {
+    "ticket": "Ticket Support",
+    "event": "Event Info",
+    "account": "Account Help",
+    "faq": "FAQ",
+}
+
+MATCHER.add_table("route", KEYWORD_ROUTES, exclusions={
+    agent_type: phrases for agent_type, phrases in EXCLUSIONS.items()
+})
+
 
 class RouterAgent:
-    """Routes queries - smart keyword matching with LLM fallback"""
+    """Routes queries - keywords → local classifier → LLM fallback"""
     
-    def __init__(self):
-        self._llm = None
+    def __init__(self, classifier=None):
+        # None = built from the shared vector store once it is warm
+        self._classifier = classifier
+        # Route source counters - keyword/local skip the LLM entirely
+        self.stats: Dict[str, int] = {"keyword": 0, "local": 0, "llm": 0, "default": 0}
     
     @property
-    def llm(self):
-        if self._llm is None:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if api_key:
-                try:
-                    self._llm = ChatGoogleGenerativeAI(
-                        model="gemini-1.5-flash",
-                        google_api_key=api_key,
-                        temperature=0.1,
-                    )
-                except Exception as e:
-                    print(f"[Router] LLM init failed: {e}")
-        return self._llm
+    def classifier(self):
+        if self._classifier is None and RAG_AVAILABLE:
+            try:
+                self._classifier = create_classifier(get_ready_vector_store())
+            except Exception as e:
+                print(f"[Router] Local classifier init failed: {e}")
+        return self._classifier
+    
+    def route_stats(self) -> Dict:
+        total = sum(self.stats.values())
+        skipped = self.stats["keyword"] + self.stats["local"]
+        return {
+            **self.stats,
+            "llm_skip_rate": round(skipped / total, 3) if total else 0.0,
+        }
     
     def _keyword_classify(self, message: str) -> AgentType | None:
-        """Smart keyword matching with exclusions"""
-        msg_lower = message.lower()
-        
-        # Check keywords in order
-        for keyword, agent_type in KEYWORD_ROUTES:
-            if keyword in msg_lower:
-                # Check exclusions
-                exclusions = EXCLUSIONS.get(agent_type, [])
-                excluded = any(excl in msg_lower for excl in exclusions)
-                
-                if not excluded:
-                    return agent_type
-        
-        return None
+        """Smart keyword matching with exclusions (whole words, priority order)"""
+        return MATCHER.scan(message).first("route")
+    
+    async def _llm_classify(self, message: str, cap: float = ROUTER_TIMEOUT_SECONDS) -> AgentType | None:
+        """One-word LLM classification - None if the LLM is unavailable, fails or is out of time"""
+        if not gateway.available or cap <= 0:
+            return None
+        try:
+            prompt = ROUTER_PROMPT.format(message=message)
+            response = await within(gateway.ainvoke(prompt, temperature=0.1), "router", cap)
+            result = response.strip().lower()
+        except Exception as e:
+            print(f"[Router] LLM error: {e}")
+            count_error("router_llm")
+            return None
+        for agent_type in ("ticket", "event", "account"):
+            if agent_type in result:
+                return agent_type
+        return "faq"
     
     async def classify(self, message: str) -> Tuple[AgentType, str]:
         """Classify with keyword routing first, LLM fallback"""
+        started = time.perf_counter()
+        agent_type, routing_msg, source = await self._classify(message)
+        self.stats[source] += 1
+        ROUTE_SECONDS.observe(time.perf_counter() - started, source)
+        ROUTES_TOTAL.inc(source, agent_type)
+        return agent_type, routing_msg
+    
+    async def _classify(self, message: str) -> Tuple[AgentType, str, str]:
+        """(agent, routing message, source) - source is keyword/local/llm/default"""
         
         # Try keyword routing (instant)
         keyword_result = self._keyword_classify(message)
         if keyword_result:
-            return keyword_result, f"[Fast] → {self.get_agent_description(keyword_result)}"
+            return keyword_result, f"[Fast] → {self.get_agent_description(keyword_result)}", "keyword"
+        
+        # Classifier and LLM share one router budget (ROUTER_TIMEOUT_SECONDS,
+        # further capped by the turn deadline)
+        router_expires = time.monotonic() + ROUTER_TIMEOUT_SECONDS
         
-        # LLM fallback for ambiguous queries
-        if self.llm:
+        # Local embedding classifier (~ms, no network - but it queues on the
+        # RAG executor behind this turn's retrieval)
+        local_result = None
+        if self.classifier:
             try:
-                prompt = f"""Classify this query for FanFirst support.
-Reply with ONLY one word: ticket, event, account, or faq
-
-Query: {message}
-
-Answer:"""
-                
-                response = await self.llm.ainvoke([HumanMessage(content=prompt)])
-                result = response.content.strip().lower()
-                
-                if "ticket" in result:
-                    return "ticket", "Routing to Ticket Support"
-                elif "event" in result:
-                    return "event", "Routing to Event Info"
-                elif "account" in result:
-                    return "account", "Routing to Account Help"
-                else:
-                    return "faq", "Routing to FAQ"
-                    
+                local_result, confidence = await within(
+                    self.classifier.aclassify(message), "router", ROUTER_TIMEOUT_SECONDS,
+                )
+                if confidence >= ROUTER_CONFIDENCE_THRESHOLD:
+                    return local_result, f"[Local] → {self.get_agent_description(local_result)}", "local"
+            except DeadlineExceeded as e:
+                print(f"[Router] Local classifier timed out: {e}")
             except Exception as e:
-                print(f"[Router] LLM error: {e}")
+                print(f"[Router] Local classifier error: {e}")
+        
+        # LLM fallback for ambiguous queries, with whatever router budget is left
+        llm_result = await self._llm_classify(message, router_expires - time.monotonic())
+        if llm_result:
+            return llm_result, f"Routing to {LLM_ROUTE_MESSAGES[llm_result]}", "llm"
+        
+        # Low-confidence local guess still beats a blind default
+        if local_result:
+            return local_result, f"Routing to {self.get_agent_description(local_result)}", "local"
         
         # Default to FAQ
-        return "faq", "Routing to FAQ"
+        return "faq", "Routing to FAQ", "default"
     
     def get_agent_description(self, agent_type: AgentType) -> str:
         descriptions = {
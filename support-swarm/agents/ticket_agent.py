@@ -1,11 +1,15 @@
 # Ticket Agent - Hybrid: Cache → RAG → LLM
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
 from typing import List, Dict, AsyncGenerator
-import os
+
+from metrics import track_ttft, count_answer, count_error
+from deadline import within, RETRIEVAL_TIMEOUT_SECONDS, SEMANTIC_CACHE_TIMEOUT_SECONDS
+from llm_gateway import gateway, STREAM_INTERRUPTED
+from .matcher import MATCHER
 
 try:
-    from vector_store import get_vector_store
+    from vector_store import get_ready_vector_store
+    from semantic_cache import get_semantic_cache
+    from extractive import extractive_answer
     RAG_AVAILABLE = True
 except ImportError:
     RAG_AVAILABLE = False
@@ -62,74 +66,108 @@ Artist gets 10% royalty on resales."""),
 ]
 
 
+TICKET_FALLBACK = """🎫 **Ticket Support**
+
+Quick help:
+- Refunds: Dashboard → My Tickets
+- Transfer: Select ticket → Transfer
+- QR Code: Select ticket → Show QR
+
+Email: support@fanfirst.com"""
+
+MATCHER.add_table("ticket", TICKET_KEYWORDS)
+
+
 def find_ticket_cache(message: str) -> str | None:
-    msg_lower = message.lower()
-    for keyword, response in TICKET_KEYWORDS:
-        if keyword in msg_lower:
-            return response
-    return None
+    return MATCHER.scan(message).first("ticket")
 
 
 class TicketAgent:
     """Ticket support with Hybrid: Cache → RAG → LLM"""
     
     def __init__(self):
-        self._llm = None
         self._vector_store = None
-    
-    @property
-    def llm(self):
-        if self._llm is None:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if api_key:
-                try:
-                    self._llm = ChatGoogleGenerativeAI(
-                        model="gemini-1.5-flash",
-                        google_api_key=api_key,
-                        temperature=0.7,
-                        streaming=True,
-                    )
-                except Exception as e:
-                    print(f"[TicketAgent] LLM init failed: {e}")
-        return self._llm
+        self._semantic_cache = None
     
     @property
     def vector_store(self):
         if self._vector_store is None and RAG_AVAILABLE:
             try:
-                self._vector_store = get_vector_store()
+                self._vector_store = get_ready_vector_store()
             except Exception as e:
                 print(f"[TicketAgent] Vector store init failed: {e}")
         return self._vector_store
     
+    @property
+    def semantic_cache(self):
+        if self._semantic_cache is None and RAG_AVAILABLE:
+            try:
+                self._semantic_cache = get_semantic_cache()
+            except Exception as e:
+                print(f"[TicketAgent] Semantic cache init failed: {e}")
+        return self._semantic_cache
+    
     async def stream_response(
         self, 
         message: str, 
         history: List[Dict], 
         db=None,
-        user_id: str = None
+        user_id: str = None,
+        retrieval=None
     ) -> AsyncGenerator[str, None]:
         
         # LAYER 1: Cache
         cached = find_ticket_cache(message)
         if cached:
             print(f"[TicketAgent] Cache hit!")
-            for i in range(0, len(cached), 20):
-                yield cached[i:i+20]
+            count_answer("ticket", "exact_cache")
+            yield cached
             return
         
+        # LAYER 1b: Semantic cache
+        if self.semantic_cache:
+            try:
+                cached = await within(
+                    self.semantic_cache.alookup("ticket", message),
+                    "semantic_cache", SEMANTIC_CACHE_TIMEOUT_SECONDS,
+                )
+            except Exception as e:
+                print(f"[TicketAgent] Semantic cache error: {e}")
+                count_error("semantic_cache")
+            if cached:
+                print("[TicketAgent] Semantic cache hit!")
+                count_answer("ticket", "semantic_cache")
+                yield cached
+                return
+        
         # LAYER 2: RAG
         context = ""
-        if self.vector_store:
+        passages = None
+        if retrieval or self.vector_store:
             try:
-                context = self.vector_store.get_context(message)
+                # Prefer the turn's shared lookup (already running since routing)
+                passages, context = await within(
+                    retrieval.get() if retrieval else self.vector_store.aget_passages(message),
+                    "retrieval", RETRIEVAL_TIMEOUT_SECONDS,
+                )
                 if context:
                     print(f"[TicketAgent] RAG context found")
             except Exception as e:
                 print(f"[TicketAgent] RAG error: {e}")
+                count_error("retrieval")
+        
+        # LAYER 2b: Extractive answer, when confident enough to skip the LLM
+        if RAG_AVAILABLE:
+            extracted = await extractive_answer("ticket", message, passages, confident_only=True)
+            if extracted:
+                print("[TicketAgent] Extractive answer")
+                count_answer("ticket", "extractive")
+                yield extracted
+                return
         
         # LAYER 3: LLM with context
-        if self.llm:
+        if gateway.available:
+            answer = ""
             try:
                 if context:
                     prompt = f"""You are Ticket Support for FanFirst.
@@ -149,22 +187,33 @@ User: {message}
 
 Reply:"""
                 
-                async for chunk in self.llm.astream([HumanMessage(content=prompt)]):
-                    if chunk.content:
-                        yield chunk.content
-                return
+                async for text in track_ttft("ticket", gateway.astream(prompt)):
+                    answer += text
+                    yield text
             except Exception as e:
                 print(f"[TicketAgent] LLM error: {e}")
+                count_error("llm")
+                if answer:
+                    # Output has started - end this reply, never append a fallback to it
+                    count_answer("ticket", "llm_partial")
+                    yield STREAM_INTERRUPTED
+                    return
+            else:
+                if self.semantic_cache:
+                    try:
+                        await self.semantic_cache.astore("ticket", message, answer)
+                    except Exception as e:
+                        print(f"[TicketAgent] Semantic cache store error: {e}")
+                        count_error("semantic_cache")
+                count_answer("ticket", "llm")
+                return
         
-        # LAYER 4: Fallback
-        fallback = """🎫 **Ticket Support**
-
-Quick help:
-- Refunds: Dashboard → My Tickets
-- Transfer: Select ticket → Transfer
-- QR Code: Select ticket → Show QR
-
-Email: support@fanfirst.com"""
-        
-        for i in range(0, len(fallback), 20):
-            yield fallback[i:i+20]
+        # LAYER 4: Extractive answer (LLM unavailable, failing or over budget), then fallback
+        if RAG_AVAILABLE:
+            extracted = await extractive_answer("ticket", message, passages)
+            if extracted:
+                count_answer("ticket", "extractive")
+                yield extracted
+                return
+        count_answer("ticket", "fallback")
+        yield TICKET_FALLBACK
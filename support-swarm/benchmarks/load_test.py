@@ -0,0 +1,332 @@
+# WebSocket load test - how many concurrent chats one deployment handles
+# Starts the server with FAKE_LLM=1 (deterministic Gemini stand-in, no key or
+# network needed), opens N concurrent /ws/chat connections, replays a mix of
+# cache-hit, RAG and LLM-bound questions, and reports throughput, TTFT and
+# total-turn percentiles plus CPU/RSS per server process.
+#
+#   python benchmarks/load_test.py --connections 50 --turns 20
+#   python benchmarks/load_test.py --workers 4 --mix cache=0.2,rag=0.3,llm=0.5 --unique
+#   python benchmarks/load_test.py --url ws://host:8000/ws/chat   # existing server
+#
+# Fake LLM timing: FAKE_LLM_TTFT_MS, FAKE_LLM_TOKENS_PER_SEC, FAKE_LLM_TOKENS
+# (pass with --env). The embedding model must already be in the local
+# Hugging Face cache to run fully offline.
+
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import websockets
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+QUESTIONS: Dict[str, List[str]] = {
+    # Answered whole from the agents' keyword caches
+    "cache": [
+        "How do I get a refund?",
+        "How do I transfer my ticket?",
+        "What is FanFirst?",
+        "What events are coming up?",
+        "How do I connect my wallet?",
+        "Where is my QR code?",
+    ],
+    # Covered by the knowledge base - RAG context (+ LLM or extractive)
+    "rag": [
+        "What blockchain are the NFT tickets minted on?",
+        "How many questions are in the FanIQ quiz?",
+        "How is the quiz scored?",
+        "Do artists earn royalties when tickets are resold?",
+        "What happens to my ticket after the event?",
+    ],
+    # Open-ended - needs the LLM
+    "llm": [
+        "Can I bring my dog to the venue?",
+        "My friend wants to come with me, what should we do?",
+        "Is there parking near the stadium?",
+        "I lost my phone before the show, help!",
+        "Can I change the name on my booking?",
+    ],
+}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in QUESTIONS:
+            raise SystemExit(f"unknown question category: {name} (have {', '.join(QUESTIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentiles(samples: List[float]) -> Dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+
+    return {"count": len(ordered), "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
+
+
+# -- server process --
+
+def child_pids(pid: int) -> List[int]:
+    """pid and all its descendants (uvicorn/gunicorn workers)"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        found.append(current)
+        stack.extend(children.get(current, []))
+    return found
+
+
+def read_proc(pid: int) -> Optional[Dict]:
+    """CPU seconds and resident memory for one process"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    # fields[0] is state (field 3); utime/stime are fields 14/15
+    return {"cpu": (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, "rss_mb": rss_pages * PAGE_SIZE / 2**20}
+
+
+class ResourceSampler:
+    """Polls /proc for the server and its workers while the test runs"""
+
+    def __init__(self, root_pid: int, interval: float = 0.5):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.first: Dict[int, float] = {}
+        self.last: Dict[int, Dict] = {}
+        self.peak_rss: Dict[int, float] = {}
+
+    def sample(self):
+        for pid in child_pids(self.root_pid):
+            stats = read_proc(pid)
+            if stats is None:
+                continue
+            self.first.setdefault(pid, stats["cpu"])
+            self.last[pid] = stats
+            self.peak_rss[pid] = max(self.peak_rss.get(pid, 0.0), stats["rss_mb"])
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def report(self, wall: float) -> Dict:
+        return {
+            str(pid): {
+                "cpu_percent": round((self.last[pid]["cpu"] - self.first[pid]) / wall * 100, 1),
+                "rss_mb": round(self.last[pid]["rss_mb"], 1),
+                "peak_rss_mb": round(self.peak_rss[pid], 1),
+            }
+            for pid in sorted(self.last)
+        }
+
+
+def start_server(port: int, workers: int, extra_env: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ, FAKE_LLM="1", **extra_env)
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL)
+
+
+def wait_ready(base_url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"server not ready after {timeout}s")
+
+
+# -- clients --
+
+class Results:
+    def __init__(self):
+        self.ttft: Dict[str, List[float]] = {name: [] for name in QUESTIONS}
+        self.total: Dict[str, List[float]] = {name: [] for name in QUESTIONS}
+        self.errors = 0
+        self.turns = 0
+
+
+async def run_connection(url: str, questions: List[tuple], results: Results, think: float, turn_timeout: float):
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            conversation_id = None
+            for category, question in questions:
+                started = time.perf_counter()
+                first = None
+                await ws.send(json.dumps({"message": question, "conversation_id": conversation_id}))
+                try:
+                    while True:
+                        frame = json.loads(await asyncio.wait_for(ws.recv(), turn_timeout))
+                        if frame["type"] == "routing":
+                            conversation_id = frame["conversation_id"]
+                        elif frame["type"] == "stream" and first is None:
+                            first = time.perf_counter() - started
+                        elif frame["type"] in ("complete", "cancelled"):
+                            break
+                except asyncio.TimeoutError:
+                    results.errors += 1
+                    return
+                results.turns += 1
+                results.total[category].append(time.perf_counter() - started)
+                if first is not None:
+                    results.ttft[category].append(first)
+                if think:
+                    await asyncio.sleep(think)
+    except Exception as e:
+        print(f"connection failed: {e}", file=sys.stderr)
+        results.errors += 1
+
+
+def build_workload(args, mix: Dict[str, float]) -> List[List[tuple]]:
+    rng = random.Random(args.seed)
+    categories, weights = list(mix), list(mix.values())
+    workload, nonce = [], 0
+    for _ in range(args.connections):
+        turns = []
+        for _ in range(args.turns):
+            category = rng.choices(categories, weights)[0]
+            question = rng.choice(QUESTIONS[category])
+            if args.unique:
+                # Defeats exact/semantic caches and single-flight coalescing
+                nonce += 1
+                question = f"{question} (ref {nonce})"
+            turns.append((category, question))
+        workload.append(turns)
+    return workload
+
+
+async def run(args) -> Dict:
+    mix = parse_mix(args.mix)
+    workload = build_workload(args, mix)
+    results = Results()
+    sampler = ResourceSampler(args.server_pid) if args.server_pid else None
+    sampler_task = asyncio.create_task(sampler.run()) if sampler else None
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_connection(args.url, turns, results, args.think_ms / 1000, args.turn_timeout)
+        for turns in workload
+    ))
+    wall = time.perf_counter() - started
+
+    if sampler_task:
+        sampler_task.cancel()
+        sampler.sample()
+
+    all_ttft = [s for samples in results.ttft.values() for s in samples]
+    all_total = [s for samples in results.total.values() for s in samples]
+    return {
+        "connections": args.connections,
+        "turns_per_connection": args.turns,
+        "mix": mix,
+        "unique": args.unique,
+        "wall_seconds": round(wall, 2),
+        "turns": results.turns,
+        "errors": results.errors,
+        "throughput_turns_per_sec": round(results.turns / wall, 1) if wall else 0.0,
+        "ttft": percentiles(all_ttft),
+        "total": percentiles(all_total),
+        "by_category": {
+            name: {"ttft": percentiles(results.ttft[name]), "total": percentiles(results.total[name])}
+            for name in mix
+        },
+        "server_processes": sampler.report(wall) if sampler else None,
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{report['turns']} turns over {report['connections']} connections in {report['wall_seconds']}s "
+          f"({report['throughput_turns_per_sec']} turns/s, {report['errors']} errors)")
+    print(f"{'':10} {'TTFT p50/p95/p99 (ms)':>28} {'total p50/p95/p99 (ms)':>28}")
+
+    def row(label: str, ttft: Dict, total: Dict):
+        fmt = lambda s: f"{s.get('p50_ms', '-')}/{s.get('p95_ms', '-')}/{s.get('p99_ms', '-')}"
+        print(f"{label:10} {fmt(ttft):>28} {fmt(total):>28}")
+
+    row("all", report["ttft"], report["total"])
+    for name, stats in report["by_category"].items():
+        row(name, stats["ttft"], stats["total"])
+    if report["server_processes"]:
+        print("\nserver processes:")
+        for pid, stats in report["server_processes"].items():
+            print(f"  pid {pid}: cpu {stats['cpu_percent']}%  rss {stats['rss_mb']} MB (peak {stats['peak_rss_mb']} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /ws/chat load test")
+    parser.add_argument("--url", help="ws:// URL of a running server (default: start one with FAKE_LLM=1)")
+    parser.add_argument("--server-pid", type=int, help="sample CPU/RSS of this pid (and children) with --url")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=10, help="turns per connection")
+    parser.add_argument("--mix", default="cache=0.4,rag=0.3,llm=0.3")
+    parser.add_argument("--unique", action="store_true", help="make every question distinct")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between a connection's turns")
+    parser.add_argument("--turn-timeout", type=float, default=60)
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="server env override")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    server = None
+    if not args.url:
+        extra_env = dict(item.split("=", 1) for item in args.env)
+        server = start_server(args.port, args.workers, extra_env)
+        args.url = f"ws://127.0.0.1:{args.port}/ws/chat"
+        args.server_pid = server.pid
+        try:
+            wait_ready(f"http://127.0.0.1:{args.port}", args.ready_timeout)
+        except BaseException:
+            server.terminate()
+            raise
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
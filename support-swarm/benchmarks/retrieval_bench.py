@@ -0,0 +1,271 @@
+# Retrieval benchmark - recall@k vs latency across KB sizes and backends
+# Runs a labeled query -> doc set against KNOWLEDGE_BASE padded with
+# synthetic distractor chunks (default 1k/10k/100k) on every retrieval
+# backend, and reports recall@k, MRR, query latency, index build time and
+# memory. A cutoff table shows what the distance threshold in
+# VectorStore.format_context (1.5) and n_results=3 keep or drop.
+#
+#   python benchmarks/retrieval_bench.py
+#   python benchmarks/retrieval_bench.py --sizes 1000,10000 --backends numpy
+#   python benchmarks/retrieval_bench.py --embedder hash    # offline, no model
+#
+# The hash embedder is a bag-of-words stand-in: use it to compare backend
+# build/query cost, not to tune n_results or the cutoff - those need the real
+# embedding model's distances.
+# Synthetic chunk embeddings are cached under --cache-dir, so re-runs only
+# pay for index builds and queries. Each row builds a fresh index: NumPy
+# loads the corpus in one upsert, Chroma gets its own collection (the
+# in-process client is shared) in --build-batch chunks and drops it after.
+
+from typing import Dict, List, Tuple
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval_backends import BACKENDS, create_backend  # noqa: E402
+from vector_store import EMBEDDING_MODEL, KNOWLEDGE_BASE, SentenceTransformerEmbedder  # noqa: E402
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+KS = (1, 3, 5, 10)
+
+# Paraphrased user questions -> the KNOWLEDGE_BASE entry that answers them
+LABELED_QUERIES: List[Tuple[str, str]] = [
+    ("what is fanfirst", "about_1"),
+    ("how does fanfirst stop scalpers and bots", "about_1"),
+    ("why is this better than ticketmaster", "about_2"),
+    ("do artists get paid when tickets are resold", "about_2"),
+    ("what exactly is an nft ticket", "nft_1"),
+    ("can my ticket be counterfeited", "nft_1"),
+    ("which blockchain are tickets minted on", "nft_2"),
+    ("what happens to my ticket after the show", "nft_2"),
+    ("what is the faniq quiz for", "quiz_1"),
+    ("why do I have to answer questions about the artist", "quiz_1"),
+    ("how many questions are in the quiz", "quiz_2"),
+    ("how long do I have to answer each quiz question", "quiz_2"),
+    ("how do I raise my fandom score", "fandom_1"),
+    ("what does the fandom score unlock", "fandom_1"),
+    ("what are the steps to buy a ticket", "purchase_1"),
+    ("which wallets are supported for purchases", "purchase_1"),
+    ("can I pay with a credit card", "purchase_2"),
+    ("how much are gas fees", "purchase_2"),
+    ("the concert was cancelled, do I get my money back", "refund_1"),
+    ("can I cancel my order after buying", "refund_1"),
+    ("how much can I sell my ticket for", "resale_1"),
+    ("is reselling tickets allowed", "resale_1"),
+    ("is my personal data safe", "security_1"),
+    ("what does the spotify integration read", "security_1"),
+    ("how do I link metamask", "wallet_1"),
+    ("phantom wallet connection steps", "wallet_1"),
+    ("which events are on sale", "events_1"),
+    ("where is the taylor swift concert", "events_1"),
+    ("how do I contact support", "support_1"),
+    ("I need urgent help with my order", "support_1"),
+]
+
+_VENUES = ["Arena", "Stadium", "Theatre", "Hall", "Park", "Center", "Dome", "Pavilion"]
+_CITIES = ["Austin", "Denver", "Seattle", "Miami", "Chicago", "Boston", "Atlanta", "Portland", "Phoenix", "Nashville"]
+_TOPICS = ["parking", "accessibility", "bag policy", "merch", "age limits", "food", "re-entry", "weather", "seating"]
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+# -- corpus --
+
+def synthetic_corpus(size: int, seed: int) -> List[dict]:
+    """KNOWLEDGE_BASE plus distractors made from its own sentences (hard negatives)"""
+    rng = random.Random(seed)
+    sentences = [
+        s.strip()
+        for doc in KNOWLEDGE_BASE
+        for s in _SENTENCE_SPLIT.split(" ".join(doc["content"].split()))
+        if len(s.strip()) > 20
+    ]
+    docs = [dict(doc) for doc in KNOWLEDGE_BASE]
+    for i in range(max(0, size - len(docs))):
+        venue = f"{rng.choice(_CITIES)} {rng.choice(_VENUES)}"
+        topic = rng.choice(_TOPICS)
+        body = " ".join(rng.sample(sentences, 2))
+        docs.append({
+            "id": f"synthetic_{i}",
+            "content": f"{venue} {topic} notes (#{i}): {body} Ask staff at {venue} about {topic}.",
+            "category": "synthetic",
+            "keywords": [],
+        })
+    return docs
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words hashing - fast and offline, for backend comparisons"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"[a-z0-9]+", text.lower()):
+                h = int(hashlib.md5(word.encode()).hexdigest()[:8], 16)
+                out[row, h % self.dim] += 1.0 if h & 1 << 31 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1.0, norms)
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        return self.encode(texts)
+
+
+def embed_corpus(docs: List[dict], embedder, name: str, seed: int, cache_dir: str) -> Tuple[np.ndarray, float]:
+    """(embeddings, seconds spent embedding) - cached per corpus/model"""
+    path = os.path.join(cache_dir, f"corpus_{name.replace('/', '_')}_{len(docs)}_{seed}.npy")
+    if os.path.exists(path):
+        return np.load(path), 0.0
+    started = time.perf_counter()
+    embeddings = np.asarray(embedder([doc["content"] for doc in docs]), dtype=np.float32)
+    seconds = time.perf_counter() - started
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(path, embeddings)
+    return embeddings, seconds
+
+
+# -- measurement --
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE / 2**20
+
+
+def pct(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+
+def evaluate(backend, query_vectors: np.ndarray, expected: List[str], cutoffs: List[float]) -> Dict:
+    k_max = max(KS)
+    latencies, ranks, top3 = [], [], []
+    for vector, answer in zip(query_vectors, expected):
+        started = time.perf_counter()
+        results = backend.query(vector[None, :], k_max)[0]
+        latencies.append(time.perf_counter() - started)
+        ids = [doc["id"] for doc in results]
+        ranks.append(ids.index(answer) + 1 if answer in ids else None)
+        top3.append([(doc["id"] == answer, doc["distance"]) for doc in results[:3]])
+
+    started = time.perf_counter()
+    backend.query(query_vectors, k_max)
+    batch_seconds = time.perf_counter() - started
+
+    n = len(expected)
+    report = {
+        **{f"recall@{k}": round(sum(1 for r in ranks if r and r <= k) / n, 3) for k in KS},
+        "mrr@10": round(sum(1 / r for r in ranks if r) / n, 3),
+        "query_p50_ms": pct(latencies, 0.50),
+        "query_p95_ms": pct(latencies, 0.95),
+        "batch_qps": round(n / batch_seconds, 1) if batch_seconds else None,
+        "cutoffs": {},
+    }
+    # What get_context(n_results=3, distance < cutoff) would hand the LLM
+    for cutoff in cutoffs:
+        kept = [(hit, d) for rows in top3 for hit, d in rows if d < cutoff]
+        answered = sum(1 for rows in top3 if any(hit and d < cutoff for hit, d in rows))
+        report["cutoffs"][str(cutoff)] = {
+            "context_recall": round(answered / n, 3),
+            "context_precision": round(sum(1 for hit, _ in kept if hit) / len(kept), 3) if kept else 0.0,
+            "avg_docs_kept": round(len(kept) / n, 2),
+        }
+    return report
+
+
+def run(args) -> List[Dict]:
+    embedder = HashEmbedder() if args.embedder == "hash" else SentenceTransformerEmbedder(EMBEDDING_MODEL)
+    embedder_name = "hash" if args.embedder == "hash" else EMBEDDING_MODEL
+    queries = [q for q, _ in LABELED_QUERIES]
+    expected = [doc_id for _, doc_id in LABELED_QUERIES]
+
+    started = time.perf_counter()
+    query_vectors = np.asarray(embedder(queries), dtype=np.float32)
+    embed_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+    rows = []
+    for size in args.sizes:
+        docs = synthetic_corpus(size, args.seed)
+        embeddings, embed_seconds = embed_corpus(docs, embedder, embedder_name, args.seed, args.cache_dir)
+        for name in args.backends:
+            try:
+                before = rss_mb()
+                started = time.perf_counter()
+                if name == "chroma":
+                    backend = create_backend(name, collection_name=f"bench_{size}_{uuid.uuid4().hex[:8]}")
+                    batch = args.build_batch  # Chroma caps the rows per upsert
+                else:
+                    backend = create_backend(name)
+                    batch = len(docs)
+                for i in range(0, len(docs), batch):
+                    backend.upsert(docs[i:i + batch], embeddings[i:i + batch])
+                build_seconds = time.perf_counter() - started
+                memory = rss_mb() - before
+            except ImportError as e:
+                print(f"[skip] {name}: {e}")
+                continue
+            row = {
+                "backend": name,
+                "docs": len(docs),
+                "embedder": embedder_name,
+                "corpus_embed_seconds": round(embed_seconds, 2),
+                "query_embed_ms": round(embed_ms, 3),
+                "build_seconds": round(build_seconds, 3),
+                "memory_mb": round(memory, 1),
+                **evaluate(backend, query_vectors, expected, args.cutoffs),
+            }
+            rows.append(row)
+            print_row(row)
+            if name == "chroma":
+                backend.client.delete_collection(backend.collection.name)
+            del backend
+    return rows
+
+
+def print_row(row: Dict):
+    recall = " ".join(f"R@{k}={row[f'recall@{k}']:.2f}" for k in KS)
+    print(
+        f"{row['backend']:7} {row['docs']:>7} docs | {recall} MRR={row['mrr@10']:.3f} | "
+        f"query p50 {row['query_p50_ms']}ms p95 {row['query_p95_ms']}ms | "
+        f"build {row['build_seconds']}s mem {row['memory_mb']}MB"
+    )
+    for cutoff, stats in row["cutoffs"].items():
+        print(
+            f"{'':17} distance < {cutoff}: context recall {stats['context_recall']:.2f}, "
+            f"precision {stats['context_precision']:.2f}, {stats['avg_docs_kept']} docs/query"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval recall/latency benchmark")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="KB sizes (chunks)")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--embedder", choices=("model", "hash"), default="model")
+    parser.add_argument("--cutoffs", default="1.0,1.2,1.5", help="distance thresholds to evaluate")
+    parser.add_argument("--build-batch", type=int, default=5000, help="docs per upsert call (chroma)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--cache-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",")]
+    args.backends = [b.strip() for b in args.backends.split(",")]
+    args.cutoffs = [float(c) for c in args.cutoffs.split(",")]
+
+    rows = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
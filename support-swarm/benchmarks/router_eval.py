@@ -0,0 +1,337 @@
+# Router evaluation - accuracy, confusion and LLM share per routing strategy
+# Runs a labeled query corpus through each layer of RouterAgent on its own
+# (keyword table, local embedding classifier, LLM) and through the full
+# cascade, reporting accuracy, a confusion matrix, latency and the fraction
+# of traffic resolved without the LLM. Exits 1 when the cascade sends more
+# than --max-llm-fraction of queries to the LLM (or more than a saved
+# --baseline plus --tolerance), so a KEYWORD_ROUTES or classifier edit that
+# silently reroutes traffic onto the slow path fails CI.
+#
+#   python benchmarks/router_eval.py
+#   python benchmarks/router_eval.py --embedder hash --max-llm-fraction 0.3
+#   python benchmarks/router_eval.py --save-baseline router_baseline.json
+#   python benchmarks/router_eval.py --baseline router_baseline.json --tolerance 0.02
+#
+# The LLM layer uses the FAKE_LLM stand-in unless --llm real (needs
+# GEMINI_API_KEY) - fake LLM accuracy is not meaningful, its latency is.
+#
+# The corpus must be held out from the classifier's LABELED_EXAMPLES: the run
+# aborts (exit 2) if any query copies or nearly copies a training example.
+
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+LABELS = ("ticket", "event", "account", "faq")
+UNRESOLVED = "-"
+
+# (query, expected agent) - keyword hits and paraphrases that need the
+# classifier or LLM, roughly in proportion to real traffic. Held out from
+# agents/intent_classifier.py LABELED_EXAMPLES (see training_overlap)
+LABELED_QUERIES: List[Tuple[str, str]] = [
+    ("How do I get a refund?", "ticket"),
+    ("I want to cancel my order", "ticket"),
+    ("How do I transfer my ticket to my brother?", "ticket"),
+    ("Where is my QR code?", "ticket"),
+    ("Can I resell my seats?", "ticket"),
+    ("I need to purchase two more tickets", "ticket"),
+    ("I'd like to be reimbursed for my seats", "ticket"),
+    ("I can't make it on Saturday, what happens to my seat", "ticket"),
+    ("the entry code isn't loading on my phone", "ticket"),
+    ("my card got billed two times", "ticket"),
+    ("what's the highest price I'm allowed to ask for my seat", "ticket"),
+    ("send my pass to a friend", "ticket"),
+    ("are these seats refundable", "ticket"),
+    ("my qrcode won't scan at the gate", "ticket"),
+    ("When is the Lakers game?", "event"),
+    ("Is Taylor Swift coming to town?", "event"),
+    ("What events are on the calendar?", "event"),
+    ("Any concerts this weekend?", "event"),
+    ("When is Drake performing?", "event"),
+    ("who is playing in Los Angeles next month", "event"),
+    ("what time do doors open", "event"),
+    ("any NBA matchups this spring", "event"),
+    ("where does the tour play in Chicago", "event"),
+    ("what's on sale right now", "event"),
+    ("How do I connect my wallet?", "account"),
+    ("How is my fandom score calculated?", "account"),
+    ("I can't login", "account"),
+    ("Update my profile picture", "account"),
+    ("Can I hook up Spotify?", "account"),
+    ("add my ethereum address to my account", "account"),
+    ("reset my credentials", "account"),
+    ("change the email on file", "account"),
+    ("my phantom extension won't pair", "account"),
+    ("I want to shut down my membership", "account"),
+    ("ways to boost my reputation on the site", "account"),
+    ("What is FanFirst?", "faq"),
+    ("How does FanFirst work?", "faq"),
+    ("Why is this better than Ticketmaster?", "faq"),
+    ("Is my data safe?", "faq"),
+    ("which chain are the passes issued on", "faq"),
+    ("Explain NFT tickets", "faq"),
+    ("what keeps bots from grabbing all the seats", "faq"),
+    ("who founded FanFirst", "faq"),
+    ("why do I need to pass a trivia test before buying", "faq"),
+    ("is this platform trustworthy", "faq"),
+    ("do artists get a cut of resales", "faq"),
+    ("is this legit", "faq"),
+    ("what safety checks do sellers go through", "faq"),
+]
+
+
+def load_corpus(path: Optional[str]) -> List[Tuple[str, str]]:
+    """Built-in corpus, or a JSONL file of {"query": ..., "agent": ...}"""
+    if not path:
+        return LABELED_QUERIES
+    corpus = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if row["agent"] not in LABELS:
+                    raise SystemExit(f"unknown agent {row['agent']!r} in {path}")
+                corpus.append((row["query"], row["agent"]))
+    return corpus
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def training_overlap(corpus: List[Tuple[str, str]], min_jaccard: float = 0.6) -> List[Tuple[str, str, float]]:
+    """(query, training example, similarity) for eval queries that copy or nearly copy a classifier example"""
+    from agents.intent_classifier import LABELED_EXAMPLES
+
+    examples = [example for group in LABELED_EXAMPLES.values() for example in group]
+    overlaps = []
+    for query, _ in corpus:
+        q_tokens = _tokens(query)
+        q_text, q_set = " ".join(q_tokens), set(q_tokens)
+        for example in examples:
+            e_tokens = _tokens(example)
+            e_text, e_set = " ".join(e_tokens), set(e_tokens)
+            jaccard = len(q_set & e_set) / len(q_set | e_set) if q_set | e_set else 1.0
+            # Containment catches "I was charged twice" inside a longer example
+            if q_text in e_text or e_text in q_text or jaccard >= min_jaccard:
+                overlaps.append((query, example, round(jaccard, 2)))
+    return overlaps
+
+
+def pct(samples: List[float], p: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+
+# -- strategies --
+
+class _Embeddings:
+    """Just enough of VectorStore for IntentClassifier (embed + executor)"""
+
+    def __init__(self, embedder):
+        from concurrent.futures import ThreadPoolExecutor
+        self.embed = embedder
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+
+def build_classifier(args):
+    from agents.intent_classifier import create_classifier
+    if args.embedder == "hash":
+        from retrieval_bench import HashEmbedder
+        embedder = HashEmbedder()
+    else:
+        from vector_store import EMBEDDING_MODEL, SentenceTransformerEmbedder
+        embedder = SentenceTransformerEmbedder(EMBEDDING_MODEL)
+    classifier = create_classifier(_Embeddings(embedder))
+    if classifier is None:
+        raise SystemExit("local classifier unavailable (numpy missing?)")
+    classifier.warm_up()
+    return classifier
+
+
+async def evaluate(router, classifier, corpus, concurrency: int) -> Dict[str, List[Tuple[str, float]]]:
+    """strategy -> [(predicted label or UNRESOLVED, seconds)] in corpus order"""
+    from agents.intent_classifier import ROUTER_CONFIDENCE_THRESHOLD
+
+    keyword, local, local_argmax = [], [], []
+    for query, _ in corpus:
+        started = time.perf_counter()
+        label = router._keyword_classify(query)
+        keyword.append((label or UNRESOLVED, time.perf_counter() - started))
+
+        started = time.perf_counter()
+        label, confidence = classifier.classify(query)
+        seconds = time.perf_counter() - started
+        local_argmax.append((label, seconds))
+        local.append((label if confidence >= ROUTER_CONFIDENCE_THRESHOLD else UNRESOLVED, seconds))
+
+    # LLM-bound strategies run concurrently - serial calls would just add up TTFTs
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(coro_fn, query):
+        async with semaphore:
+            started = time.perf_counter()
+            result = await coro_fn(query)
+            return result, time.perf_counter() - started
+
+    async def llm_only(query):
+        return await router._llm_classify(query) or UNRESOLVED
+
+    async def cascade(query):
+        agent_type, _, source = await router._classify(query)
+        return agent_type, source
+
+    llm = await asyncio.gather(*(timed(llm_only, q) for q, _ in corpus))
+    full = await asyncio.gather(*(timed(cascade, q) for q, _ in corpus))
+    return {
+        "keyword": keyword,
+        "local": local,
+        "local_argmax": local_argmax,
+        "llm": llm,
+        "cascade": [(agent_type, seconds) for (agent_type, _), seconds in full],
+        "_sources": [source for (_, source), _ in full],
+    }
+
+
+# -- report --
+
+def summarize(predictions: List[Tuple[str, float]], expected: List[str]) -> Dict:
+    n = len(expected)
+    resolved = [(p, e) for (p, _), e in zip(predictions, expected) if p != UNRESOLVED]
+    confusion = {e: {p: 0 for p in LABELS + (UNRESOLVED,)} for e in LABELS}
+    for (predicted, _), actual in zip(predictions, expected):
+        confusion[actual][predicted] += 1
+    latencies = [s for _, s in predictions]
+    return {
+        "coverage": round(len(resolved) / n, 3),
+        "accuracy": round(sum(1 for p, e in resolved if p == e) / n, 3),
+        "precision_when_resolved": round(sum(1 for p, e in resolved if p == e) / len(resolved), 3) if resolved else None,
+        "p50_ms": pct(latencies, 0.50),
+        "p95_ms": pct(latencies, 0.95),
+        "confusion": confusion,
+    }
+
+
+def build_report(results: Dict, corpus, args) -> Dict:
+    expected = [agent for _, agent in corpus]
+    sources = results.pop("_sources")
+    n = len(corpus)
+    by_source = {source: sources.count(source) for source in ("keyword", "local", "llm", "default")}
+    misroutes = [
+        {"query": query, "expected": agent, "got": predicted, "source": source}
+        for (query, agent), (predicted, _), source in zip(corpus, results["cascade"], sources)
+        if predicted != agent
+    ]
+    return {
+        "queries": n,
+        "llm": "fake" if args.llm == "fake" else "real",
+        "embedder": args.embedder,
+        "strategies": {name: summarize(predictions, expected) for name, predictions in results.items()},
+        "cascade_sources": by_source,
+        # Traffic that got past both local layers (default = LLM was tried or down)
+        "llm_fraction": round((by_source["llm"] + by_source["default"]) / n, 3),
+        "non_llm_fraction": round((by_source["keyword"] + by_source["local"]) / n, 3),
+        "misroutes": misroutes,
+    }
+
+
+def print_report(report: Dict):
+    print(f"{report['queries']} labeled queries (llm={report['llm']}, embedder={report['embedder']})\n")
+    print(f"{'strategy':13} {'coverage':>9} {'accuracy':>9} {'resolved acc':>13} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, stats in report["strategies"].items():
+        resolved = stats["precision_when_resolved"]
+        print(f"{name:13} {stats['coverage']:>9.2f} {stats['accuracy']:>9.2f} "
+              f"{'-' if resolved is None else f'{resolved:.2f}':>13} {stats['p50_ms']:>9} {stats['p95_ms']:>9}")
+
+    print("\ncascade confusion (rows = expected, columns = routed):")
+    confusion = report["strategies"]["cascade"]["confusion"]
+    print(f"{'':9}" + "".join(f"{label:>9}" for label in LABELS))
+    for actual in LABELS:
+        print(f"{actual:9}" + "".join(f"{confusion[actual][label]:>9}" for label in LABELS))
+
+    sources = report["cascade_sources"]
+    print("\ncascade sources: " + ", ".join(f"{k} {v}" for k, v in sources.items()))
+    print(f"resolved without LLM: {report['non_llm_fraction']:.1%}   LLM fraction: {report['llm_fraction']:.1%}")
+    if report["misroutes"]:
+        print("\nmisroutes:")
+        for miss in report["misroutes"]:
+            print(f"  [{miss['source']}] {miss['query']!r}: expected {miss['expected']}, got {miss['got']}")
+
+
+def check(report: Dict, args) -> List[str]:
+    failures = []
+    if args.max_llm_fraction is not None and report["llm_fraction"] > args.max_llm_fraction:
+        failures.append(f"LLM fraction {report['llm_fraction']:.3f} > max {args.max_llm_fraction}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if report["llm_fraction"] > baseline["llm_fraction"] + args.tolerance:
+            failures.append(
+                f"LLM fraction {report['llm_fraction']:.3f} > baseline {baseline['llm_fraction']:.3f} + {args.tolerance}"
+            )
+        # Accuracy of the layers that don't depend on the LLM stand-in
+        for name in ("keyword", "local"):
+            now, before = report["strategies"][name]["accuracy"], baseline["strategies"][name]["accuracy"]
+            if now < before - args.tolerance:
+                failures.append(f"{name} accuracy {now:.3f} < baseline {before:.3f} - {args.tolerance}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Router accuracy / LLM-share evaluation")
+    parser.add_argument("--corpus", help="JSONL of {\"query\", \"agent\"} (default: built-in set)")
+    parser.add_argument("--embedder", choices=("model", "hash"), default="model")
+    parser.add_argument("--llm", choices=("fake", "real"), default="fake")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel LLM-bound queries")
+    parser.add_argument("--max-llm-fraction", type=float, default=0.25, help="fail above this (negative disables)")
+    parser.add_argument("--baseline", help="fail on regressions against this saved report")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="allowed drift vs --baseline")
+    parser.add_argument("--save-baseline", help="write this run's report as a baseline")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    if args.max_llm_fraction is not None and args.max_llm_fraction < 0:
+        args.max_llm_fraction = None
+
+    if args.llm == "fake":
+        os.environ["FAKE_LLM"] = "1"
+    # Measure the router, not the shared rate limit
+    os.environ.setdefault("LLM_RPM", "0")
+
+    from agents.router import RouterAgent
+    from llm_gateway import gateway
+
+    corpus = load_corpus(args.corpus)
+    overlaps = training_overlap(corpus)
+    if overlaps:
+        for query, example, similarity in overlaps:
+            print(f"FAIL: eval query {query!r} overlaps classifier example {example!r} (jaccard {similarity})",
+                  file=sys.stderr)
+        sys.exit(2)
+    gateway.warm_up()  # The LLM layer stays closed until the clients are built
+    router = RouterAgent(classifier=build_classifier(args))
+    report = build_report(asyncio.run(evaluate(router, router.classifier, corpus, args.concurrency)), corpus, args)
+    print_report(report)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    failures = check(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# Circuit Breaker - stop calling Gemini while it is failing
+#   closed    - calls flow; outcomes of the last LLM_BREAKER_WINDOW calls are
+#               kept, and the breaker opens when the error rate or the share
+#               of slow calls (first token > LLM_BREAKER_SLOW_SECONDS) crosses
+#               its threshold
+#   open      - calls are refused at once for LLM_BREAKER_OPEN_SECONDS, so
+#               turns go straight to their cache/RAG/fallback layers
+#   half_open - up to LLM_BREAKER_PROBES calls go through as probes; all
+#               succeeding closes the breaker, any failure re-opens it
+
+from collections import deque
+from typing import Deque, Dict, Optional
+import os
+import time
+
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "4"))
+LLM_BREAKER_SLOW_RATE = float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.5"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+LLM_BREAKER_PROBES = int(os.getenv("LLM_BREAKER_PROBES", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_OK = 0
+_SLOW = 1
+_ERROR = 2
+
+
+class CircuitOpenError(Exception):
+    """Breaker is open - the call was not attempted"""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: int = LLM_BREAKER_WINDOW,
+        min_calls: int = LLM_BREAKER_MIN_CALLS,
+        error_rate: float = LLM_BREAKER_ERROR_RATE,
+        slow_seconds: float = LLM_BREAKER_SLOW_SECONDS,
+        slow_rate: float = LLM_BREAKER_SLOW_RATE,
+        open_seconds: float = LLM_BREAKER_OPEN_SECONDS,
+        probes: int = LLM_BREAKER_PROBES,
+    ):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.probes = max(1, probes)
+
+        self._state = CLOSED
+        self._outcomes: Deque[int] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probes_passed = 0
+        self.last_error: Optional[str] = None
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probes_passed = 0
+        return self._state
+
+    def allows_calls(self) -> bool:
+        """Cheap check for agents - False while open"""
+        return self.state != OPEN
+
+    def before_call(self) -> bool:
+        """Admit a call or raise CircuitOpenError - returns True if it is a probe"""
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and self._probes_in_flight + self._probes_passed < self.probes:
+            self._probes_in_flight += 1
+            return True
+        self.rejected += 1
+        raise CircuitOpenError(f"LLM circuit {state}")
+
+    def record_latency(self, latency: float, probe: bool = False):
+        """Call answered (first token) after latency seconds"""
+        outcome = _SLOW if latency > self.slow_seconds else _OK
+        if probe:
+            self._probes_in_flight -= 1
+            if self._state != HALF_OPEN:
+                return
+            if outcome == _SLOW:
+                self._open(f"probe slow ({latency:.1f}s)")
+                return
+            self._probes_passed += 1
+            if self._probes_passed >= self.probes:
+                self._close()
+            return
+        self._record(outcome)
+
+    def record_failure(self, error: BaseException, probe: bool = False):
+        self.last_error = f"{type(error).__name__}: {error}"
+        if probe:
+            self._probes_in_flight -= 1
+            if self._state == HALF_OPEN:
+                self._open("probe failed")
+            return
+        self._record(_ERROR)
+
+    def release_probe(self):
+        """Probe abandoned (cancelled) before an outcome - let another one through"""
+        self._probes_in_flight -= 1
+
+    def _record(self, outcome: int):
+        if self._state != CLOSED:
+            return  # Late result from before the breaker opened
+        self._outcomes.append(outcome)
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        errors = self._outcomes.count(_ERROR)
+        slow = self._outcomes.count(_SLOW)
+        if errors / calls >= self.error_rate:
+            self._open(f"error rate {errors}/{calls}")
+        elif slow / calls >= self.slow_rate:
+            self._open(f"slow rate {slow}/{calls}")
+
+    def _open(self, reason: str):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        print(f"[CircuitBreaker] LLM circuit OPEN - {reason}")
+
+    def _close(self):
+        self._state = CLOSED
+        self._outcomes.clear()
+        print("[CircuitBreaker] LLM circuit closed")
+
+    def stats(self) -> Dict:
+        state = self.state
+        calls = len(self._outcomes)
+        return {
+            "state": state,
+            "error_rate": round(self._outcomes.count(_ERROR) / calls, 3) if calls else 0.0,
+            "slow_rate": round(self._outcomes.count(_SLOW) / calls, 3) if calls else 0.0,
+            "window_calls": calls,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_in_seconds": round(max(0.0, self._opened_at + self.open_seconds - time.monotonic()), 1)
+            if state == OPEN else 0.0,
+            "last_error": self.last_error,
+        }
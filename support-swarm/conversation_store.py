@@ -0,0 +1,424 @@
+# Conversation Store - Bounded conversation history with TTL/LRU eviction
+# CONVERSATION_BACKEND=memory  per-process; turns are slotted records with
+#                              interned role/agent codes, capped by turn count
+#                              and memory (default)
+# CONVERSATION_BACKEND=sqlite  one WAL-mode SQLite file (CONVERSATION_DB_PATH)
+#                              shared by every worker on the host, so
+#                              `uvicorn --workers N` / gunicorn need no sticky
+#                              sessions. Single host only: WAL relies on
+#                              shared memory and does not work over NFS/SMB or
+#                              other network filesystems, so replicas on
+#                              separate hosts still need sticky sessions (or a
+#                              networked store - not provided here)
+# Both expose get_or_create / append / history / sweep / stats, plus async
+# variants (aget_or_create / aappend / ahistory / astats) for the event loop.
+# SQLite work runs on a dedicated thread, and lock contention or I/O failures
+# surface as ConversationStoreError so a turn can carry on without history.
+
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Deque, Dict, List, Optional
+
+# Interned codes - one small int per role / agent type instead of a string per turn
+ROLES: List[str] = ["user", "assistant"]
+AGENT_TYPES: List[Optional[str]] = [None, "ticket", "event", "account", "faq"]
+_ROLE_CODES: Dict[str, int] = {role: i for i, role in enumerate(ROLES)}
+_AGENT_CODES: Dict[Optional[str], int] = {agent: i for i, agent in enumerate(AGENT_TYPES)}
+
+
+def _code(value: Optional[str], codes: Dict, table: List) -> int:
+    """Look up (or intern) a code for a role / agent type"""
+    code = codes.get(value)
+    if code is None:
+        code = len(table)
+        table.append(value)
+        codes[value] = code
+    return code
+
+
+class ConversationStoreError(Exception):
+    """The store could not be read or written (e.g. SQLite busy past its timeout)"""
+
+
+class Turn:
+    """One message in a conversation"""
+    __slots__ = ("role", "agent", "content")
+
+    def __init__(self, role: int, agent: int, content: str):
+        self.role = role
+        self.agent = agent
+        self.content = content
+
+    def nbytes(self) -> int:
+        return _TURN_OVERHEAD + sys.getsizeof(self.content)
+
+    def to_dict(self) -> Dict:
+        return {"role": ROLES[self.role], "content": self.content, "agent_type": AGENT_TYPES[self.agent]}
+
+
+class Conversation:
+    """Turns of one conversation plus its accounting"""
+    __slots__ = ("turns", "nbytes", "last_seen")
+
+    def __init__(self, now: float):
+        self.turns: Deque[Turn] = deque()
+        self.nbytes = _CONVERSATION_OVERHEAD
+        self.last_seen = now
+
+
+_TURN_OVERHEAD = sys.getsizeof(Turn(0, 0, ""))
+_CONVERSATION_OVERHEAD = sys.getsizeof(object.__new__(Conversation)) + sys.getsizeof(deque())
+
+
+class ConversationStore:
+    """In-memory conversations with per-conversation and global caps"""
+
+    name = "memory"
+
+    def __init__(
+        self,
+        max_turns: int = None,
+        max_bytes: int = None,
+        ttl_seconds: float = None,
+        max_conversations: int = None,
+    ):
+        self.max_turns = max_turns or int(os.getenv("CONVERSATION_MAX_TURNS", "40"))
+        self.max_bytes = max_bytes or int(float(os.getenv("CONVERSATION_MAX_MB", "64")) * 1024 * 1024)
+        self.ttl_seconds = ttl_seconds or float(os.getenv("CONVERSATION_TTL_SECONDS", "1800"))
+        self.max_conversations = max_conversations or int(os.getenv("CONVERSATION_MAX_COUNT", "20000"))
+
+        # Ordered oldest → most recently used, so LRU and TTL both evict from the front
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._nbytes = 0
+        self._turns = 0
+        self._last_sweep = time.monotonic()
+        self.evictions = {"ttl": 0, "lru": 0, "memory": 0, "truncated": 0}
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._conversations
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def _touch(self, conversation_id: str) -> Optional[Conversation]:
+        conv = self._conversations.get(conversation_id)
+        if conv is not None:
+            conv.last_seen = time.monotonic()
+            self._conversations.move_to_end(conversation_id)
+        return conv
+
+    def get_or_create(self, conversation_id: str) -> Conversation:
+        """Return a conversation, creating it if missing"""
+        conv = self._touch(conversation_id)
+        if conv is None:
+            conv = Conversation(time.monotonic())
+            self._conversations[conversation_id] = conv
+            self._nbytes += conv.nbytes
+            self._evict()
+        return conv
+
+    def append(self, conversation_id: str, role: str, content: str, agent_type: str = None):
+        """Add a turn, trimming the oldest turns past max_turns"""
+        conv = self.get_or_create(conversation_id)
+        turn = Turn(
+            _code(role, _ROLE_CODES, ROLES),
+            _code(agent_type, _AGENT_CODES, AGENT_TYPES),
+            content,
+        )
+        size = turn.nbytes()
+        conv.turns.append(turn)
+        conv.nbytes += size
+        self._nbytes += size
+        self._turns += 1
+
+        while len(conv.turns) > self.max_turns:
+            self._drop_turn(conv)
+            self.evictions["truncated"] += 1
+
+        self._evict()
+
+    def history(self, conversation_id: str) -> List[Dict]:
+        """Turns as plain dicts (the shape agents expect)"""
+        conv = self._touch(conversation_id)
+        if conv is None:
+            return []
+        return [turn.to_dict() for turn in conv.turns]
+
+    def _drop_turn(self, conv: Conversation):
+        size = conv.turns.popleft().nbytes()
+        conv.nbytes -= size
+        self._nbytes -= size
+        self._turns -= 1
+
+    def _remove(self, conversation_id: str, reason: str):
+        conv = self._conversations.pop(conversation_id)
+        self._nbytes -= conv.nbytes
+        self._turns -= len(conv.turns)
+        self.evictions[reason] += 1
+
+    def _evict(self):
+        """Apply TTL, count and memory caps - always oldest first"""
+        now = time.monotonic()
+        # TTL sweep is O(expired) since the dict is in last-seen order
+        if now - self._last_sweep >= 1.0:
+            self._last_sweep = now
+            self.sweep(now)
+
+        while len(self._conversations) > self.max_conversations:
+            self._remove(next(iter(self._conversations)), "lru")
+
+        # Keep the most recent conversation even if it alone is over budget
+        while self._nbytes > self.max_bytes and len(self._conversations) > 1:
+            self._remove(next(iter(self._conversations)), "memory")
+
+    def sweep(self, now: float = None) -> int:
+        """Drop conversations idle longer than the TTL"""
+        now = now or time.monotonic()
+        cutoff = now - self.ttl_seconds
+        expired = 0
+        while self._conversations:
+            conversation_id, conv = next(iter(self._conversations.items()))
+            if conv.last_seen >= cutoff:
+                break
+            self._remove(conversation_id, "ttl")
+            expired += 1
+        return expired
+
+    # Async variants - all in-memory, so no thread hop (and no cross-thread access)
+    async def aget_or_create(self, conversation_id: str):
+        self.get_or_create(conversation_id)
+
+    async def aappend(self, conversation_id: str, role: str, content: str, agent_type: str = None):
+        self.append(conversation_id, role, content, agent_type)
+
+    async def ahistory(self, conversation_id: str) -> List[Dict]:
+        return self.history(conversation_id)
+
+    async def astats(self) -> Dict:
+        return self.stats()
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.name,
+            "conversations": len(self._conversations),
+            "turns": self._turns,
+            "bytes": self._nbytes,
+            "max_bytes": self.max_bytes,
+            "evictions": dict(self.evictions),
+        }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_last_seen ON conversations (last_seen);
+CREATE TABLE IF NOT EXISTS turns (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    agent_type TEXT,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_conversation ON turns (conversation_id, seq);
+"""
+
+
+def _store_errors(method):
+    """sqlite3 failures (locked past the busy timeout, I/O) → ConversationStoreError"""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except sqlite3.Error as e:
+            raise ConversationStoreError(f"{type(e).__name__}: {e}") from e
+    return wrapper
+
+
+class SQLiteConversationStore:
+    """Conversations in a WAL-mode SQLite file shared across worker processes on one host"""
+
+    name = "sqlite"
+
+    # Expiry scans touch the whole file - run them far less often than the
+    # in-memory store does
+    SWEEP_INTERVAL_SECONDS = 30.0
+
+    def __init__(
+        self,
+        path: str = None,
+        max_turns: int = None,
+        ttl_seconds: float = None,
+        max_conversations: int = None,
+    ):
+        self.path = path or os.getenv("CONVERSATION_DB_PATH", "conversations.db")
+        self.max_turns = max_turns or int(os.getenv("CONVERSATION_MAX_TURNS", "40"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("CONVERSATION_TTL_SECONDS", "1800"))
+        self.max_conversations = max_conversations or int(os.getenv("CONVERSATION_MAX_COUNT", "20000"))
+
+        # One connection per process. The async API runs everything on one
+        # dedicated thread, so a busy database (another worker mid-write)
+        # waits there, never on the event loop; the lock covers sync callers
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversations")
+        busy_timeout = float(os.getenv("CONVERSATION_DB_TIMEOUT_SECONDS", "2"))
+        self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=busy_timeout)
+        # WAL lets every worker read while one writes; NORMAL sync is safe under WAL
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        self._last_sweep = 0.0
+        # Counted by this process only - other workers evict too
+        self.evictions = {"ttl": 0, "lru": 0, "truncated": 0}
+
+    @_store_errors
+    def __contains__(self, conversation_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return row is not None
+
+    @_store_errors
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def _write(self, statements):
+        """Run (sql, params) pairs in one IMMEDIATE transaction - returns rowcounts"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                counts = [self._db.execute(sql, params).rowcount for sql, params in statements]
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        return counts
+
+    def _touch_sql(self, conversation_id: str):
+        # Wall clock, not monotonic - last_seen is compared across processes
+        return (
+            "INSERT INTO conversations (id, last_seen) VALUES (?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET last_seen = excluded.last_seen",
+            (conversation_id, time.time()),
+        )
+
+    @_store_errors
+    def get_or_create(self, conversation_id: str):
+        """Create the conversation if missing and mark it as used"""
+        self._write([self._touch_sql(conversation_id)])
+        self._evict()
+
+    @_store_errors
+    def append(self, conversation_id: str, role: str, content: str, agent_type: str = None):
+        """Add a turn, trimming the oldest turns past max_turns"""
+        counts = self._write([
+            self._touch_sql(conversation_id),
+            (
+                "INSERT INTO turns (conversation_id, role, agent_type, content) VALUES (?, ?, ?, ?)",
+                (conversation_id, role, agent_type, content),
+            ),
+            (
+                "DELETE FROM turns WHERE conversation_id = ? AND seq <= ("
+                "SELECT seq FROM turns WHERE conversation_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                (conversation_id, conversation_id, self.max_turns),
+            ),
+        ])
+        self.evictions["truncated"] += max(counts[2], 0)
+        self._evict()
+
+    @_store_errors
+    def history(self, conversation_id: str) -> List[Dict]:
+        """Turns as plain dicts (the shape agents expect)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content, agent_type FROM turns WHERE conversation_id = ? ORDER BY seq",
+                (conversation_id,),
+            ).fetchall()
+            if rows:
+                try:
+                    self._db.execute(
+                        "UPDATE conversations SET last_seen = ? WHERE id = ?", (time.time(), conversation_id)
+                    )
+                except sqlite3.OperationalError:
+                    pass  # Best effort - the next append refreshes last_seen anyway
+        return [{"role": role, "content": content, "agent_type": agent} for role, content, agent in rows]
+
+    def _evict(self):
+        now = time.time()
+        if now - self._last_sweep < self.SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        self.sweep(now)
+        # Oldest past the count cap (turns go with them via ON DELETE CASCADE)
+        removed, = self._write([(
+            "DELETE FROM conversations WHERE id IN ("
+            "SELECT id FROM conversations ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+            (self.max_conversations,),
+        )])
+        self.evictions["lru"] += max(removed, 0)
+
+    @_store_errors
+    def sweep(self, now: float = None) -> int:
+        """Drop conversations idle longer than the TTL"""
+        cutoff = (now or time.time()) - self.ttl_seconds
+        expired, = self._write([("DELETE FROM conversations WHERE last_seen < ?", (cutoff,))])
+        self.evictions["ttl"] += max(expired, 0)
+        return expired
+
+    @_store_errors
+    def stats(self) -> Dict:
+        with self._lock:
+            conversations, = self._db.execute("SELECT COUNT(*) FROM conversations").fetchone()
+            turns, = self._db.execute("SELECT COUNT(*) FROM turns").fetchone()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = None
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "conversations": conversations,
+            "turns": turns,
+            "bytes": size,
+            "evictions": dict(self.evictions),
+        }
+
+    # Async variants - off the event loop, on the store's own thread
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def aget_or_create(self, conversation_id: str):
+        await self._run(self.get_or_create, conversation_id)
+
+    async def aappend(self, conversation_id: str, role: str, content: str, agent_type: str = None):
+        await self._run(self.append, conversation_id, role, content, agent_type)
+
+    async def ahistory(self, conversation_id: str) -> List[Dict]:
+        return await self._run(self.history, conversation_id)
+
+    async def astats(self) -> Dict:
+        return await self._run(self.stats)
+
+
+CONVERSATION_BACKEND = os.getenv("CONVERSATION_BACKEND", "memory").lower()
+
+STORES = {
+    ConversationStore.name: ConversationStore,
+    SQLiteConversationStore.name: SQLiteConversationStore,
+}
+
+
+def create_conversation_store(name: str = None):
+    name = (name or CONVERSATION_BACKEND).lower()
+    if name not in STORES:
+        raise ValueError(f"Unknown CONVERSATION_BACKEND '{name}' (choose from {', '.join(STORES)})")
+    return STORES[name]()
@@ -0,0 +1,96 @@
+# Deadline - per-turn latency budget
+# Each turn starts a deadline (TURN_BUDGET_SECONDS) for its first reply token.
+# It travels with the turn in a context variable, so the layers below honor
+# it without extra arguments:
+#   router      - local classifier + LLM classification share ROUTER_TIMEOUT_SECONDS
+#   semantic_cache - agents wait at most SEMANTIC_CACHE_TIMEOUT_SECONDS for a lookup
+#   retrieval   - agents wait at most RETRIEVAL_TIMEOUT_SECONDS for context
+#   generation  - LLM queue wait + first token must fit in what is left
+# A layer that runs out of budget raises DeadlineExceeded and the agent falls
+# through to its next layer; the abandoned call is cancelled.
+
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+import asyncio
+import os
+import time
+
+T = TypeVar("T")
+
+TURN_BUDGET_SECONDS = float(os.getenv("TURN_BUDGET_SECONDS", "6"))
+ROUTER_TIMEOUT_SECONDS = float(os.getenv("ROUTER_TIMEOUT_SECONDS", "2"))
+RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "1.5"))
+SEMANTIC_CACHE_TIMEOUT_SECONDS = float(os.getenv("SEMANTIC_CACHE_TIMEOUT_SECONDS", "0.5"))
+
+# Counted per layer, for /health
+expirations = {"router": 0, "semantic_cache": 0, "retrieval": 0, "extractive": 0, "llm_queue": 0, "first_token": 0}
+
+
+class DeadlineExceeded(Exception):
+    """The turn's budget ran out before this layer finished"""
+
+
+class Deadline:
+    def __init__(self, budget: float = TURN_BUDGET_SECONDS):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("turn_deadline", default=None)
+
+
+def start_turn(budget: float = TURN_BUDGET_SECONDS) -> Deadline:
+    """Start the budget for the current task (and tasks it creates)"""
+    deadline = Deadline(budget)
+    _current.set(deadline)
+    return deadline
+
+
+def remaining(cap: Optional[float] = None) -> Optional[float]:
+    """Seconds left for this turn, optionally capped - None means unbounded"""
+    deadline = _current.get()
+    left = deadline.remaining() if deadline is not None else None
+    if cap is not None:
+        left = cap if left is None else min(left, cap)
+    return left
+
+
+async def within(awaitable: Awaitable[T], layer: str, cap: Optional[float] = None) -> T:
+    """Await with the turn's remaining budget - the awaitable is cancelled on expiry"""
+    timeout = remaining(cap)
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        expirations[layer] = expirations.get(layer, 0) + 1
+        raise DeadlineExceeded(f"{layer} exceeded {timeout:.2f}s budget")
+
+
+async def first_within(stream: AsyncIterator[T], layer: str = "first_token") -> AsyncIterator[T]:
+    """Pass a stream through, requiring its first item within the remaining budget"""
+    try:
+        timeout = remaining()
+        # Timed in this task rather than wait_for's, so the stream's context and
+        # task-bound state survive into its later steps
+        budget = asyncio.timeout(timeout)
+        try:
+            async with budget:
+                first = await stream.__anext__()
+        except StopAsyncIteration:
+            return
+        except TimeoutError:
+            if not budget.expired():
+                raise  # The stream's own timeout, not the turn's
+            expirations[layer] = expirations.get(layer, 0) + 1
+            raise DeadlineExceeded(f"{layer} exceeded {timeout:.2f}s budget")
+        yield first
+        async for item in stream:
+            yield item
+    finally:
+        await stream.aclose()
+
+
+def deadline_stats() -> dict:
+    return {"turn_budget_seconds": TURN_BUDGET_SECONDS, "expired": dict(expirations)}
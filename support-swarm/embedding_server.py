@@ -0,0 +1,363 @@
+# Embedding Server - one sentence-transformers model shared by every worker
+# Each process that embeds locally holds its own torch + model copy. Run this
+# once per host and point the workers at it:
+#
+#   python embedding_server.py --socket /tmp/support-embed.sock &
+#   EMBEDDING_SOCKET=/tmp/support-embed.sock gunicorn main:app -k uvicorn.workers.UvicornWorker -w 4
+#
+# Requests from all workers are batched dynamically: the first request opens
+# a window of EMBEDDING_BATCH_WINDOW_MS (or until EMBEDDING_MAX_BATCH texts),
+# and everything that arrives meanwhile is encoded in one model call. Texts
+# queued while a batch is encoding join the next one.
+#
+# The socket is bound before the model loads, and "info" reports
+# "loading": true until it is ready. Workers started alongside the server
+# wait for it (up to EMBEDDING_STARTUP_GRACE_SECONDS) instead of each loading
+# a model of their own.
+#
+# When EMBEDDING_SOCKET is set VectorStore embeds through RemoteEmbedder,
+# which falls back to an in-process model while the server is unreachable
+# and drops that model again once the server answers.
+#
+# Wire format (both directions): 4-byte big-endian length + payload.
+#   request   JSON {"op": "embed", "texts": [...]} or {"op": "info"}
+#   response  JSON header, "\n", then raw float32 rows for "embed"
+#             header {"ok": true, "shape": [n, dim]} / {"ok": false, "error": ...}
+
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+EMBEDDING_SOCKET = os.getenv("EMBEDDING_SOCKET", "")
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+EMBEDDING_SOCKET_TIMEOUT = float(os.getenv("EMBEDDING_SOCKET_TIMEOUT", "10"))
+# After a failed call, embed locally for this long before trying the server again
+EMBEDDING_RETRY_SECONDS = float(os.getenv("EMBEDDING_RETRY_SECONDS", "30"))
+# A client that has never reached the server waits this long for it to come
+# up (socket not bound yet, model still loading) before falling back
+EMBEDDING_STARTUP_GRACE_SECONDS = float(os.getenv("EMBEDDING_STARTUP_GRACE_SECONDS", "120"))
+
+_LENGTH = struct.Struct(">I")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+class EmbeddingServerError(Exception):
+    """The server answered, but with an error"""
+
+
+class EmbeddingServerLoading(EmbeddingServerError):
+    """The server is up but its model is still loading"""
+
+
+def _encode_response(header: Dict, body: bytes = b"") -> bytes:
+    payload = json.dumps(header).encode("utf-8") + b"\n" + body
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def _decode_response(payload: bytes) -> Tuple[Dict, bytes]:
+    header, _, body = payload.partition(b"\n")
+    return json.loads(header), body
+
+
+# -- server --
+
+class EmbeddingServer:
+    """Unix-socket front end with dynamic batching over one embedding function"""
+
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[List[str]], object]],
+        model_name: str,
+        window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        max_batch: int = EMBEDDING_MAX_BATCH,
+    ):
+        self.embed_fn = embed_fn
+        self.model_name = model_name
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: "asyncio.Queue[Tuple[List[str], asyncio.Future]]" = None
+        self._ready: asyncio.Event = None
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.connections = 0
+
+    async def serve(self, path: str, load: Callable[[], Callable[[List[str]], object]] = None):
+        """Bind, then (if given) run load() for the embed function while already accepting clients"""
+        self._queue = asyncio.Queue()
+        self._ready = asyncio.Event()
+        if os.path.exists(path):
+            os.unlink(path)  # Stale socket from a previous run
+        server = await asyncio.start_unix_server(self._handle, path=path)
+        os.chmod(path, 0o660)
+        batcher = asyncio.create_task(self._batch_loop())
+        print(f"[Embedding] Serving {self.model_name} on {path} "
+              f"(window {self.window * 1000:g}ms, max batch {self.max_batch})")
+        try:
+            async with server:
+                if load is not None:
+                    # Requests queue until this returns; "info" says loading
+                    started = time.perf_counter()
+                    self.embed_fn = await asyncio.to_thread(load)
+                    print(f"[Embedding] {self.model_name} loaded ({time.perf_counter() - started:.1f}s)")
+                self._ready.set()
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                except asyncio.IncompleteReadError:
+                    return  # Client closed
+                if length > MAX_FRAME_BYTES:
+                    writer.write(_encode_response({"ok": False, "error": "request too large"}))
+                    return
+                writer.write(await self._respond(await reader.readexactly(length)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _respond(self, payload: bytes) -> bytes:
+        try:
+            request = json.loads(payload)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            op = request.get("op")
+            if op == "info":
+                return _encode_response({
+                    "ok": True, "model": self.model_name, "loading": not self._ready.is_set(), **self.stats(),
+                })
+            texts = request.get("texts")
+            if op != "embed" or not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("expected {\"op\": \"embed\", \"texts\": [str, ...]}")
+        except ValueError as e:
+            return _encode_response({"ok": False, "error": str(e)})
+
+        self.requests += 1
+        if not texts:
+            return _encode_response({"ok": True, "shape": [0, 0]})
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((texts, future))
+        try:
+            vectors = await future
+        except Exception as e:
+            return _encode_response({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        return _encode_response({"ok": True, "shape": list(vectors.shape)}, vectors.tobytes())
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        await self._ready.wait()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            closes = loop.time() + self.window
+            while size < self.max_batch:
+                timeout = closes - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            batch = [(texts, future) for texts, future in batch if not future.done()]
+            if not batch:
+                continue
+            flat = [text for texts, _ in batch for text in texts]
+            try:
+                # Off the loop so new requests keep queueing for the next batch
+                vectors = np.asarray(await asyncio.to_thread(self.embed_fn, flat), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(flat)
+            offset = 0
+            for texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "connections": self.connections,
+        }
+
+
+# -- client --
+
+class RemoteEmbedder:
+    """Callable texts → vectors via the embedding server, local model as fallback"""
+
+    def __init__(self, path: str, fallback: Callable[[], Callable], model_name: str = None, timeout: float = None):
+        self.path = path
+        self.model_name = model_name
+        self.timeout = timeout or EMBEDDING_SOCKET_TIMEOUT
+        self._make_fallback = fallback
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+        # RAG executor threads each keep their own connection
+        self._local = threading.local()
+        self._down_until = 0.0
+        # Until the server first answers, a missing socket or loading model
+        # means "still starting" - wait rather than load a fallback model
+        self._reached = False
+        self._starting_until = time.monotonic() + EMBEDDING_STARTUP_GRACE_SECONDS
+        self.remote_calls = 0
+        self.fallback_calls = 0
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+            if self.model_name:
+                header, _ = self._call(sock, {"op": "info"})
+                if header.get("model") != self.model_name:
+                    raise EmbeddingServerError(f"server runs {header.get('model')}, expected {self.model_name}")
+                if header.get("loading"):
+                    raise EmbeddingServerLoading(f"{self.model_name} still loading")
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+        chunks = []
+        while n:
+            chunk = sock.recv(min(n, 1 << 20))
+            if not chunk:
+                raise ConnectionError("embedding server closed the connection")
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b"".join(chunks)
+
+    def _call(self, sock: socket.socket, request: Dict) -> Tuple[Dict, bytes]:
+        payload = json.dumps(request).encode("utf-8")
+        sock.sendall(_LENGTH.pack(len(payload)) + payload)
+        (length,) = _LENGTH.unpack(self._recv_exactly(sock, _LENGTH.size))
+        header, body = _decode_response(self._recv_exactly(sock, length))
+        if not header.get("ok"):
+            raise EmbeddingServerError(header.get("error", "unknown error"))
+        return header, body
+
+    def _remote(self, texts: List[str]) -> np.ndarray:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = self._local.sock = self._connect()
+        try:
+            header, body = self._call(sock, {"op": "embed", "texts": list(texts)})
+        except BaseException:
+            # Unknown stream position - never reuse this connection
+            self._local.sock = None
+            sock.close()
+            raise
+        return np.frombuffer(body, dtype=np.float32).reshape(header["shape"])
+
+    def _remote_at_startup(self, texts: List[str]) -> np.ndarray:
+        """_remote, polling while the server is still starting up"""
+        waited = False
+        while True:
+            try:
+                return self._remote(texts)
+            except (FileNotFoundError, ConnectionRefusedError, EmbeddingServerLoading) as e:
+                if self._reached or time.monotonic() >= self._starting_until:
+                    raise
+                if not waited:
+                    waited = True
+                    print(f"[Embedding] Waiting for server at {self.path} ({e})")
+                time.sleep(0.25)
+
+    def _local_embed(self, texts: List[str]):
+        fallback = self._fallback
+        if fallback is None:
+            with self._fallback_lock:
+                if self._fallback is None:
+                    print("[Embedding] Loading in-process model as fallback")
+                    self._fallback = self._make_fallback()
+                fallback = self._fallback
+        self.fallback_calls += 1
+        return fallback(texts)
+
+    def _release_fallback(self):
+        with self._fallback_lock:
+            if self._fallback is not None:
+                self._fallback = None
+                print("[Embedding] Server is back - released the in-process model")
+
+    def __call__(self, texts: List[str]):
+        if time.monotonic() >= self._down_until:
+            try:
+                vectors = self._remote_at_startup(texts)
+                self._reached = True
+                self.remote_calls += 1
+                if self._fallback is not None:
+                    self._release_fallback()
+                return vectors
+            except (OSError, EmbeddingServerError, ValueError) as e:
+                self._down_until = time.monotonic() + EMBEDDING_RETRY_SECONDS
+                print(f"[Embedding] Server at {self.path} unavailable ({e}) - "
+                      f"embedding in-process for {EMBEDDING_RETRY_SECONDS:g}s")
+        return self._local_embed(texts)
+
+    def stats(self) -> Dict:
+        return {
+            "socket": self.path,
+            "remote_calls": self.remote_calls,
+            "fallback_calls": self.fallback_calls,
+            "fallback_loaded": self._fallback is not None,
+            "server_down": time.monotonic() < self._down_until,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared embedding server (Unix socket)")
+    parser.add_argument("--socket", default=EMBEDDING_SOCKET or "/tmp/support-embed.sock")
+    parser.add_argument("--window-ms", type=float, default=EMBEDDING_BATCH_WINDOW_MS)
+    parser.add_argument("--max-batch", type=int, default=EMBEDDING_MAX_BATCH)
+    args = parser.parse_args()
+
+    from vector_store import EMBEDDING_MODEL, SentenceTransformerEmbedder
+
+    def load():
+        embedder = SentenceTransformerEmbedder(EMBEDDING_MODEL)
+        embedder(["warm up"])
+        return embedder
+
+    # Bind first so workers starting alongside wait for this model, not load their own
+    server = EmbeddingServer(None, EMBEDDING_MODEL, args.window_ms, args.max_batch)
+    try:
+        asyncio.run(server.serve(args.socket, load=load))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# Extractive Answers - LLM-free replies assembled from the knowledge base
+# The turn's already-retrieved top passages are split into sentences, each
+# sentence is ranked by cosine similarity to the query embedding, and the
+# best few are returned in document order. No second search, no network
+# call, no API cost.
+#   EXTRACTIVE_MODE=fallback  - used when the LLM is unavailable, failing or
+#                               over the turn's budget (default)
+#   EXTRACTIVE_MODE=confident - also answers directly, skipping the LLM, when
+#                               the best sentence scores >= EXTRACTIVE_CONFIDENCE
+#   EXTRACTIVE_MODE=off
+
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+import re
+
+import numpy as np
+
+from deadline import within
+
+EXTRACTIVE_MODE = os.getenv("EXTRACTIVE_MODE", "fallback").lower()
+EXTRACTIVE_CONFIDENCE = float(os.getenv("EXTRACTIVE_CONFIDENCE", "0.7"))
+EXTRACTIVE_MIN_SIMILARITY = float(os.getenv("EXTRACTIVE_MIN_SIMILARITY", "0.35"))
+EXTRACTIVE_MAX_SENTENCES = int(os.getenv("EXTRACTIVE_MAX_SENTENCES", "3"))
+
+# Same relevance cutoff as VectorStore.format_context
+MAX_PASSAGE_DISTANCE = 1.5
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if len(s.strip()) > 3]
+
+
+def _unit_rows(matrix) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class ExtractiveAnswerer:
+    """Sentence-level extraction over the vector store's top passages"""
+
+    def __init__(
+        self,
+        vector_store,
+        max_sentences: int = EXTRACTIVE_MAX_SENTENCES,
+        min_similarity: float = EXTRACTIVE_MIN_SIMILARITY,
+    ):
+        self.vector_store = vector_store
+        self.max_sentences = max_sentences
+        self.min_similarity = min_similarity
+        # doc id -> (sentences, unit embeddings), for the current kb_version only
+        self._sentences: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        self._kb_version = vector_store.kb_version
+        self.answers: Dict[str, int] = {}
+        self.misses = 0
+
+    def _doc_sentences(self, doc: dict) -> Tuple[List[str], np.ndarray]:
+        if self._kb_version != self.vector_store.kb_version:
+            self._sentences = {}
+            self._kb_version = self.vector_store.kb_version
+        entry = self._sentences.get(doc["id"])
+        if entry is None:
+            sentences = split_sentences(doc["content"])
+            # Embedded directly - sentences would only churn the query cache
+            vectors = _unit_rows(self.vector_store.embedding_fn(sentences)) if sentences else np.zeros((0, 0))
+            entry = self._sentences[doc["id"]] = (sentences, vectors)
+        return entry
+
+    def answer(self, query: str, passages: List[dict]) -> Optional[Tuple[str, float]]:
+        """(answer, best sentence similarity) from the given passages, or None if nothing relevant"""
+        docs = [doc for doc in passages if doc["distance"] < MAX_PASSAGE_DISTANCE]
+        if not docs:
+            self.misses += 1
+            return None
+        # Retrieval already embedded the query - this is an embedding-cache hit
+        query_vector = _unit_rows(self.vector_store.embed([query])[0])
+
+        # (score, passage rank, position, sentence)
+        candidates = []
+        for rank, doc in enumerate(docs):
+            sentences, vectors = self._doc_sentences(doc)
+            if not sentences:
+                continue
+            for position, score in enumerate(vectors @ query_vector):
+                if score >= self.min_similarity:
+                    candidates.append((float(score), rank, position, sentences[position]))
+
+        if not candidates:
+            self.misses += 1
+            return None
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        chosen, seen = [], set()
+        for candidate in candidates:
+            if candidate[3] not in seen:
+                seen.add(candidate[3])
+                chosen.append(candidate)
+            if len(chosen) == self.max_sentences:
+                break
+        # Read in passage order, not score order
+        chosen.sort(key=lambda c: (c[1], c[2]))
+        return " ".join(c[3] for c in chosen), candidates[0][0]
+
+    async def aanswer(self, query: str, passages: List[dict]) -> Optional[Tuple[str, float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.vector_store.executor, self.answer, query, passages)
+
+    def stats(self) -> Dict:
+        return {"mode": EXTRACTIVE_MODE, "answers": dict(self.answers), "misses": self.misses}
+
+
+# Global instance
+_extractive = None
+
+def get_extractive_answerer() -> Optional[ExtractiveAnswerer]:
+    """Get or create the answerer - None until the vector store is warm"""
+    global _extractive
+    if _extractive is None:
+        from vector_store import get_ready_vector_store
+        vector_store = get_ready_vector_store()
+        if vector_store is not None:
+            _extractive = ExtractiveAnswerer(vector_store)
+    return _extractive
+
+
+async def extractive_answer(
+    agent_type: str,
+    message: str,
+    passages: Optional[List[dict]],
+    confident_only: bool = False,
+) -> Optional[str]:
+    """Agent layer - the extracted answer from the turn's passages, or None to fall through"""
+    if EXTRACTIVE_MODE == "off" or (confident_only and EXTRACTIVE_MODE != "confident"):
+        return None
+    if not passages:
+        return None  # Retrieval failed or ran out of budget - never search again here
+    answerer = get_extractive_answerer()
+    if answerer is None:
+        return None
+    try:
+        if confident_only:
+            # Before the LLM - part of the turn's budget
+            result = await within(answerer.aanswer(message, passages), "extractive")
+        else:
+            # Last resort after the budget may already be spent - passages are in hand
+            result = await answerer.aanswer(message, passages)
+    except Exception as e:
+        print(f"[Extractive] Error: {e}")
+        return None
+    if result is None:
+        return None
+    text, confidence = result
+    if confident_only and confidence < EXTRACTIVE_CONFIDENCE:
+        return None
+    answerer.answers[agent_type] = answerer.answers.get(agent_type, 0) + 1
+    return text
@@ -0,0 +1,91 @@
+# Fake LLM - deterministic offline stand-in for Gemini (FAKE_LLM=1)
+# Used by the benchmarks: no API key, no network, and a reply that depends
+# only on the prompt. Timing is configurable so load tests can model a
+# slow or fast upstream:
+#   FAKE_LLM_TTFT_MS        - delay before the first token
+#   FAKE_LLM_TOKENS_PER_SEC - streaming rate after that
+#   FAKE_LLM_TOKENS         - tokens per reply
+
+from typing import AsyncIterator
+import asyncio
+import hashlib
+import os
+import re
+
+FAKE_LLM_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "400"))
+FAKE_LLM_TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "50"))
+FAKE_LLM_TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "60"))
+
+_WORDS = (
+    "FanFirst tickets are NFTs minted to your wallet and verified with the FanIQ quiz so "
+    "real fans get priority access while resale caps and royalties keep prices fair"
+).split()
+
+_LABELS = ("ticket", "event", "account", "faq")
+
+
+def _seed(prompt: str) -> int:
+    return int(hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def fake_reply(prompt: str) -> str:
+    if "Reply with ONLY one word" in prompt:
+        # Router prompt - answer with a label, deterministically
+        query = prompt.rsplit("Query:", 1)[-1].lower()
+        for label in _LABELS:
+            if re.search(rf"\b{label}", query):
+                return label
+        return _LABELS[_seed(prompt) % len(_LABELS)]
+    seed = _seed(prompt)
+    return " ".join(_WORDS[(seed + i) % len(_WORDS)] for i in range(FAKE_LLM_TOKENS)) + "."
+
+
+async def fake_token_stream(prompt: str) -> AsyncIterator[str]:
+    await asyncio.sleep(FAKE_LLM_TTFT_MS / 1000)
+    interval = 1 / FAKE_LLM_TOKENS_PER_SEC if FAKE_LLM_TOKENS_PER_SEC > 0 else 0
+    for i, word in enumerate(fake_reply(prompt).split(" ")):
+        if i and interval:
+            await asyncio.sleep(interval)
+        yield word if i == 0 else " " + word
+
+
+def _prompt_text(messages) -> str:
+    return "\n".join(getattr(m, "content", str(m)) for m in messages)
+
+
+class _Message:
+    __slots__ = ("content",)
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    """Quacks like ChatGoogleGenerativeAI (ainvoke / astream)"""
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(FAKE_LLM_TTFT_MS / 1000)
+        return _Message(fake_reply(_prompt_text(messages)))
+
+    async def astream(self, messages):
+        async for token in fake_token_stream(_prompt_text(messages)):
+            yield _Message(token)
+
+
+class _GenAIChunk:
+    __slots__ = ("text", "parts")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = [text]
+
+
+class FakeGenAIModel:
+    """Quacks like genai.GenerativeModel (generate_content_async(stream=True))"""
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        return self._chunks(prompt)
+
+    async def _chunks(self, prompt: str):
+        async for token in fake_token_stream(prompt):
+            yield _GenAIChunk(token)
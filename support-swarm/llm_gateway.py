@@ -0,0 +1,330 @@
+# LLM Gateway - one shared, rate-limited entry point for every Gemini call
+# Agents used to build their own clients and call upstream unbounded, so a
+# traffic spike became a burst of 429s. Now clients are created once and
+# reused, and every call first takes a slot from a FIFO limiter:
+#   LLM_MAX_CONCURRENCY    - upstream calls (or open streams) at once
+#   LLM_RPM                - calls started per rolling minute (0 = no limit)
+#   LLM_QUEUE_TIMEOUT_SECONDS - give up waiting and let the agent fall back
+# FAKE_LLM=1 swaps in the deterministic offline stand-in from fake_llm.py
+# (benchmarks). Limits are per process. Queue wait and time to first token also count
+# against the turn's deadline (see deadline.py), and a circuit breaker
+# refuses calls outright while Gemini is failing (see circuit_breaker.py).
+
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+
+from metrics import LatencyWindow
+from circuit_breaker import CircuitBreaker
+import deadline
+
+T = TypeVar("T")
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
+GENAI_MODEL = os.getenv("GENAI_MODEL", "gemini-2.0-flash")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RPM = int(os.getenv("LLM_RPM", "120"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+FAKE_LLM = os.getenv("FAKE_LLM", "").lower() in ("1", "true", "yes")
+
+RATE_WINDOW_SECONDS = 60.0
+
+# Ends a reply whose stream failed after text was sent - a fallback answer
+# appended to a partial one would read as a single garbled reply
+STREAM_INTERRUPTED = "\n\n⚠️ Sorry, my answer was cut off. Please try again."
+
+
+def _has_module(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+LANGCHAIN_AVAILABLE = FAKE_LLM or _has_module("langchain_google_genai")
+GENAI_AVAILABLE = FAKE_LLM or _has_module("google.generativeai")
+if FAKE_LLM:
+    print("[LLMGateway] FAKE_LLM enabled - Gemini calls are simulated")
+elif not GENAI_AVAILABLE:
+    print("[LLMGateway] google-generativeai not available")
+
+
+class LLMUnavailableError(Exception):
+    """No client could be built (no API key or library)"""
+
+
+class LLMBusyError(Exception):
+    """Waited too long for a slot - caller should fall back"""
+
+
+class FairLimiter:
+    """FIFO admission with a concurrency cap and a rolling per-minute cap"""
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, rpm: int = LLM_RPM):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rpm = rpm
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._starts: Deque[float] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def queue_depth(self) -> int:
+        return sum(1 for w in self._waiters if not w.done())
+
+    async def acquire(self):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._grant()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # Slot was granted as we were cancelled - hand it on
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._grant()
+
+    def _grant(self):
+        """Admit waiters in arrival order while both limits allow"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self.in_flight < self.max_concurrency:
+            if self._waiters[0].done():  # Cancelled while queued
+                self._waiters.popleft()
+                continue
+            now = time.monotonic()
+            while self._starts and now - self._starts[0] >= RATE_WINDOW_SECONDS:
+                self._starts.popleft()
+            if self.rpm > 0 and len(self._starts) >= self.rpm:
+                # Head of the queue waits for the window to roll - nobody jumps it
+                delay = self._starts[0] + RATE_WINDOW_SECONDS - now
+                self._timer = asyncio.get_running_loop().call_later(delay, self._grant)
+                return
+            self._starts.append(now)
+            self.in_flight += 1
+            self._waiters.popleft().set_result(None)
+
+
+class LLMGateway:
+    """Shared Gemini clients behind a fair limiter"""
+
+    def __init__(
+        self,
+        limiter: FairLimiter = None,
+        breaker: CircuitBreaker = None,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.limiter = limiter or FairLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.queue_timeout = queue_timeout
+        self._chat_models: Dict[Tuple[str, float, bool], object] = {}
+        self._genai_models: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        # Set by warm_up - until then agents skip the LLM layer rather than
+        # import the client libraries on the event loop
+        self.warmed = threading.Event()
+        self.wait_times = LatencyWindow()
+        self.calls = 0
+        self.busy = 0
+        self.errors = 0
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return os.getenv("GEMINI_API_KEY")
+
+    @property
+    def configured(self) -> bool:
+        return FAKE_LLM or (bool(self.api_key) and (LANGCHAIN_AVAILABLE or GENAI_AVAILABLE))
+
+    @property
+    def available(self) -> bool:
+        """Worth trying the LLM layer - False until warmed up and while the breaker is open"""
+        return self.configured and self.warmed.is_set() and self.breaker.allows_calls()
+
+    # -- clients (built once, shared by every agent) --
+
+    def chat_model(self, temperature: float = 0.7, streaming: bool = True, model: str = LLM_MODEL):
+        """LangChain chat client - imported lazily, langchain is slow to import at boot"""
+        key = (model, temperature, streaming)
+        if FAKE_LLM:
+            from fake_llm import FakeChatModel
+            return self._chat_models.setdefault(key, FakeChatModel())
+        if key not in self._chat_models and self.api_key and LANGCHAIN_AVAILABLE:
+            with self._lock:
+                if key not in self._chat_models:
+                    try:
+                        from langchain_google_genai import ChatGoogleGenerativeAI
+                        self._chat_models[key] = ChatGoogleGenerativeAI(
+                            model=model,
+                            google_api_key=self.api_key,
+                            temperature=temperature,
+                            streaming=streaming,
+                        )
+                    except Exception as e:
+                        print(f"[LLMGateway] Chat model init failed: {e}")
+                        return None
+        return self._chat_models.get(key)
+
+    def genai_model(self, model: str = GENAI_MODEL):
+        """Direct google-generativeai client"""
+        if FAKE_LLM:
+            from fake_llm import FakeGenAIModel
+            return self._genai_models.setdefault(model, FakeGenAIModel())
+        if model not in self._genai_models and self.api_key and GENAI_AVAILABLE:
+            with self._lock:
+                if model not in self._genai_models:
+                    try:
+                        import google.generativeai as genai
+                        genai.configure(api_key=self.api_key)
+                        self._genai_models[model] = genai.GenerativeModel(model)
+                        print(f"[LLMGateway] {model} initialized ✓")
+                    except Exception as e:
+                        print(f"[LLMGateway] GenAI model init failed: {e}")
+                        return None
+        return self._genai_models.get(model)
+
+    def warm_up(self):
+        """Build the clients the agents use (blocking - run in a thread)"""
+        try:
+            self.chat_model(0.1, streaming=False)
+            self.chat_model(0.7)
+            self.genai_model()
+        finally:
+            # A client that failed to build makes calls raise LLMUnavailableError,
+            # which agents already handle
+            self.warmed.set()
+
+    # -- admission --
+
+    async def _acquire(self):
+        started = time.perf_counter()
+        budget = deadline.remaining()
+        try:
+            if budget is not None and budget < self.queue_timeout:
+                await deadline.within(self.limiter.acquire(), "llm_queue")
+            else:
+                await asyncio.wait_for(self.limiter.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.busy += 1
+            raise LLMBusyError(f"no LLM slot after {self.queue_timeout}s ({self.limiter.queue_depth()} queued)")
+        self.wait_times.observe(time.perf_counter() - started)
+        self.calls += 1
+
+    # -- calls --
+
+    async def _guarded(self, upstream: AsyncIterator[T]) -> AsyncIterator[T]:
+        """Breaker, fair admission and the first-item deadline around one upstream call"""
+        probe = self.breaker.before_call()  # Raises CircuitOpenError while open
+        try:
+            await self._acquire()
+        except BaseException:
+            if probe:
+                self.breaker.release_probe()
+            await upstream.aclose()
+            raise
+
+        started = time.perf_counter()
+        recorded = False
+        try:
+            # No first item within the turn's budget - the call is cancelled
+            async for item in deadline.first_within(upstream):
+                if not recorded:
+                    recorded = True
+                    self.breaker.record_latency(time.perf_counter() - started, probe)
+                yield item
+        except deadline.DeadlineExceeded:
+            # Only a hang past the slow threshold says something about Gemini
+            elapsed = time.perf_counter() - started
+            if elapsed > self.breaker.slow_seconds:
+                recorded = True
+                self.breaker.record_latency(elapsed, probe)
+            raise
+        except Exception as e:
+            self.errors += 1
+            if not recorded:
+                recorded = True
+                self.breaker.record_failure(e, probe)
+            raise
+        finally:
+            if probe and not recorded:
+                self.breaker.release_probe()
+            self.limiter.release()
+
+    async def ainvoke(self, prompt: str, temperature: float = 0.1) -> str:
+        """Single completion (router)"""
+        llm = self.chat_model(temperature, streaming=False)
+        if llm is None:
+            raise LLMUnavailableError("no chat model")
+
+        messages = self._messages(prompt)
+        # The coroutine is only created once the guard admits the call
+        async with aclosing(self._guarded(self._single(lambda: llm.ainvoke(messages)))) as call:
+            async for response in call:
+                return response.content
+
+    async def astream(self, prompt: str, temperature: float = 0.7) -> AsyncIterator[str]:
+        """Token stream via LangChain - the slot is held until the stream ends"""
+        llm = self.chat_model(temperature)
+        if llm is None:
+            raise LLMUnavailableError("no chat model")
+
+        # aclosing: a cancelled turn frees its slot and upstream stream right away
+        async with aclosing(self._guarded(llm.astream(self._messages(prompt)))) as stream:
+            async for chunk in stream:
+                if chunk.content:
+                    yield chunk.content
+
+    async def astream_genai(self, prompt: str, model: str = GENAI_MODEL) -> AsyncIterator[str]:
+        """Token stream via google-generativeai (FAQ)"""
+        client = self.genai_model(model)
+        if client is None:
+            raise LLMUnavailableError("no genai model")
+
+        async with aclosing(self._guarded(self._genai_chunks(client, prompt))) as stream:
+            async for chunk in stream:
+                # .text raises on chunks without text parts (e.g. safety stop)
+                text = chunk.text if chunk.parts else ""
+                if text:
+                    yield text
+
+    @staticmethod
+    def _messages(prompt: str) -> list:
+        if FAKE_LLM:
+            return [prompt]
+        from langchain_core.messages import HumanMessage
+        return [HumanMessage(content=prompt)]
+
+    @staticmethod
+    async def _single(call: Callable[[], Awaitable[T]]) -> AsyncIterator[T]:
+        yield await call()
+
+    @staticmethod
+    async def _genai_chunks(client, prompt: str):
+        response = await client.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.limiter.max_concurrency,
+            "rpm": self.limiter.rpm,
+            "in_flight": self.limiter.in_flight,
+            "queue_depth": self.limiter.queue_depth(),
+            "queue_wait": self.wait_times.summary(),
+            "calls": self.calls,
+            "busy_rejections": self.busy,
+            "errors": self.errors,
+            "breaker": self.breaker.stats(),
+        }
+
+
+# Global instance - every agent goes through this
+gateway = LLMGateway()
@@ -1,12 +1,15 @@
 # Customer Support Swarm - Main Server with RAG
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+import asyncio
+import time
 import uuid
 import os
 from dotenv import load_dotenv
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, aclosing
 
 # Load env files
 parent_dir = os.path.dirname(os.path.dirname(__file__))
@@ -20,11 +23,24 @@ print(f"[Support Swarm] GEMINI_API_KEY: {'SET ✓' if GEMINI_KEY else 'NOT SET 
 
 # Import after env is loaded
 from db import init_db
-from agents import RouterAgent, TicketAgent, EventAgent, AccountAgent, FAQAgent
+from conversation_store import ConversationStoreError, create_conversation_store
+from readiness import readiness, WARMING, READY, FAILED, DISABLED
+from metrics import ttft_summary, render_metrics, Gauge, OPEN_WEBSOCKETS, TURN_SECONDS, count_error
+from llm_gateway import gateway, STREAM_INTERRUPTED
+from agents import RouterAgent, TicketAgent, EventAgent, AccountAgent, FAQAgent, cached_responses
+from turns import TurnScheduler, turn_stats
+from single_flight import SingleFlight
+from deadline import start_turn, deadline_stats
+from stream_writer import (
+    FrameCache, StreamWriter, SlowConsumerError, ConnectionLostError, SLOW_CONSUMER_CLOSE_CODE,
+    connection_stats, lagging_connections, max_stream_lag,
+)
 
 # Try to initialize RAG
 try:
-    from vector_store import get_vector_store
+    from vector_store import get_vector_store, warm_up_vector_store, get_ready_vector_store, normalize_query
+    from semantic_cache import get_semantic_cache
+    from extractive import get_extractive_answerer
     RAG_ENABLED = True
     print("[Support Swarm] RAG: ENABLED ✓")
 except Exception as e:
@@ -32,20 +48,69 @@ except Exception as e:
     print(f"[Support Swarm] RAG: DISABLED - {e}")
 
 
+async def warm_up():
+    """Staged background startup - turns before this finishes use cache/keyword paths"""
+    # The LLM clients warm alongside RAG, so the LLM layers open as early as possible
+    await asyncio.gather(warm_up_rag(), warm_up_llm())
+
+
+async def warm_up_rag():
+    if RAG_ENABLED:
+        stage = "vector_store"
+        try:
+            readiness.set(stage, WARMING)
+            vs = await asyncio.to_thread(get_vector_store)
+            readiness.set(stage, READY, docs=vs.count(), backend=vs.backend.name)
+            
+            stage = "embedding_model"
+            readiness.set(stage, WARMING)
+            await asyncio.to_thread(warm_up_vector_store)
+            readiness.set(stage, READY)
+            
+            stage = "router_classifier"
+            classifier = router_agent.classifier
+            if classifier:
+                readiness.set(stage, WARMING)
+                await asyncio.to_thread(classifier.warm_up)
+                readiness.set(stage, READY)
+            else:
+                readiness.set(stage, DISABLED)
+        except Exception as e:
+            readiness.set(stage, FAILED, error=str(e))
+    else:
+        readiness.set("router_classifier", DISABLED)
+
+
+async def warm_up_llm():
+    # Shared LLM clients - first access imports langchain / google-generativeai.
+    # gateway.available stays False until this finishes
+    if gateway.configured:
+        try:
+            readiness.set("llm", WARMING)
+            await asyncio.to_thread(gateway.warm_up)
+            readiness.set("llm", READY)
+        except Exception as e:
+            readiness.set("llm", FAILED, error=str(e))
+    else:
+        readiness.set("llm", DISABLED)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
     
-    # Pre-load vector store
-    if RAG_ENABLED:
-        try:
-            vs = get_vector_store()
-            print(f"[Support Swarm] Vector store loaded with {vs.collection.count()} docs")
-        except Exception as e:
-            print(f"[Support Swarm] Vector store init error: {e}")
+    # Register components, then warm them up without blocking the port bind
+    for name in ("vector_store", "embedding_model"):
+        readiness.register(name, required=RAG_ENABLED)
+        if not RAG_ENABLED:
+            readiness.set(name, DISABLED)
+    readiness.register("router_classifier", required=False)
+    readiness.register("llm", required=False)
+    app.state.warm_up_task = asyncio.create_task(warm_up())
     
-    print("✅ Customer Support Swarm initialized!")
+    print("✅ Customer Support Swarm initialized! (warming up in background)")
     yield
+    app.state.warm_up_task.cancel()
 
 app = FastAPI(
     title="Customer Support Swarm",
@@ -72,8 +137,23 @@ event_agent = EventAgent()
 account_agent = AccountAgent()
 faq_agent = FAQAgent()
 
-# In-memory storage
-conversations: Dict[str, List[Dict]] = {}
+# Cached answers are JSON-encoded once here, not on every hit
+frame_cache = FrameCache(cached_responses())
+
+# Bounded conversation history - in-process, or shared by all workers on one
+# host with CONVERSATION_BACKEND=sqlite (see conversation_store.py)
+conversation_store = create_conversation_store()
+LIVE_CONVERSATIONS = Gauge("support_live_conversations", "Conversations held in the store", read=lambda: len(conversation_store))
+LAGGING_CONNECTIONS = Gauge(
+    "support_lagging_connections", "Connections behind by more than STREAM_LAG_WARN_SECONDS", read=lagging_connections
+)
+MAX_STREAM_LAG = Gauge("support_max_stream_lag_seconds", "Oldest undelivered frame across connections", read=max_stream_lag)
+
+# Sent when a turn fails before any reply text went out
+TURN_ERROR_MESSAGE = "Sorry, I encountered an issue. Please try again."
+
+# Identical questions asked at the same time share one generation
+single_flight = SingleFlight()
 
 
 class ChatMessage(BaseModel):
@@ -95,102 +175,268 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "gemini": bool(GEMINI_KEY), "rag": RAG_ENABLED}
+    vs = get_ready_vector_store() if RAG_ENABLED else None
+    sc = get_semantic_cache() if RAG_ENABLED else None
+    ex = get_extractive_answerer() if RAG_ENABLED else None
+    try:
+        conversations = await conversation_store.astats()
+    except ConversationStoreError as e:
+        conversations = {"error": str(e)}
+    return {
+        "status": "healthy",
+        "gemini": bool(GEMINI_KEY),
+        "rag": RAG_ENABLED,
+        "conversations": conversations,
+        "retrieval": vs.stats() if vs else None,
+        "routing": router_agent.route_stats(),
+        "semantic_cache": sc.stats() if sc else None,
+        "extractive": ex.stats() if ex else None,
+        "llm_ttft": ttft_summary(),
+        "llm_circuit": gateway.breaker.state,
+        "llm_gateway": gateway.stats(),
+        "connections": connection_stats(),
+        "turns": turn_stats(),
+        "single_flight": single_flight.stats(),
+        "deadlines": deadline_stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition"""
+    # Gauge callbacks may hit the conversation database - keep them off the loop
+    return PlainTextResponse(await asyncio.to_thread(render_metrics), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready")
+async def ready():
+    snapshot = readiness.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+
+def start_retrieval(message: str):
+    """Per-turn retrieval stage - returns None when RAG is unavailable"""
+    vs = get_ready_vector_store() if RAG_ENABLED else None
+    if vs is None:
+        return None  # Still warming up - agents fall back to cache/LLM
+    try:
+        return vs.start_retrieval(message)
+    except Exception as e:
+        print(f"[Support Swarm] Retrieval start error: {e}")
+        return None
+
+
+def agent_stream(agent_type: str, message: str, history: List[Dict], user_id: Optional[str], retrieval):
+    """The chosen agent's reply generator"""
+    if agent_type == "ticket":
+        return ticket_agent.stream_response(message, history, None, user_id, retrieval)
+    elif agent_type == "event":
+        return event_agent.stream_response(message, history, None, retrieval)
+    elif agent_type == "account":
+        return account_agent.stream_response(message, history, None, user_id, retrieval)
+    else:  # FAQ
+        return faq_agent.stream_response(message, history, retrieval)
+
 
+async def generate_reply(agent_type: str, message: str, history: List[Dict], user_id: Optional[str], retrieval):
+    """Agent stream that owns the turn's retrieval"""
+    try:
+        async for chunk in agent_stream(agent_type, message, history, user_id, retrieval):
+            yield chunk
+    finally:
+        # Cache-hit turns never read the context - don't leave the lookup running
+        if retrieval:
+            retrieval.cancel()
+
+
+def flight_key(agent_type: str, message: str):
+    """Answers depend only on the question, the agent and the knowledge base"""
+    vs = get_ready_vector_store() if RAG_ENABLED else None
+    if vs is None:
+        return (" ".join(message.lower().split()), agent_type, None)
+    return (normalize_query(message), agent_type, vs.kb_version)
 
-def get_or_create_conversation(conversation_id: Optional[str], visitor_id: str) -> str:
-    if conversation_id and conversation_id in conversations:
-        return conversation_id
+
+# Store failures (e.g. the shared SQLite file locked by another worker) are
+# logged and skipped - the turn carries on without history rather than dying
+
+async def get_or_create_conversation(conversation_id: Optional[str], visitor_id: str) -> str:
     new_id = conversation_id or str(uuid.uuid4())
-    conversations[new_id] = []
+    try:
+        await conversation_store.aget_or_create(new_id)
+    except ConversationStoreError as e:
+        print(f"[Conversations] get_or_create failed: {e}")
+        count_error("conversation_store")
     return new_id
 
 
-def save_message(conversation_id: str, role: str, content: str, agent_type: str = None):
-    if conversation_id not in conversations:
-        conversations[conversation_id] = []
-    conversations[conversation_id].append({
-        "role": role, "content": content, "agent_type": agent_type
-    })
+async def save_message(conversation_id: str, role: str, content: str, agent_type: str = None):
+    try:
+        await conversation_store.aappend(conversation_id, role, content, agent_type)
+    except ConversationStoreError as e:
+        print(f"[Conversations] save failed: {e}")
+        count_error("conversation_store")
 
 
-def get_history(conversation_id: str) -> List[Dict]:
-    return conversations.get(conversation_id, [])
+async def get_history(conversation_id: str) -> List[Dict]:
+    try:
+        return await conversation_store.ahistory(conversation_id)
+    except ConversationStoreError as e:
+        print(f"[Conversations] history failed: {e}")
+        count_error("conversation_store")
+        return []
 
 
-@app.websocket("/ws/chat")
-async def websocket_chat(websocket: WebSocket):
-    await websocket.accept()
-    connection_id = str(uuid.uuid4())
-    print(f"🔌 Connected: {connection_id}")
+async def run_turn(writer: StreamWriter, message: str, conversation_id: str, user_id: Optional[str]):
+    """One chat turn - runs as a task and may be cancelled by a newer message or a disconnect"""
+    # Latency budget for the first reply token - routing, retrieval and the LLM all honor it
+    start_turn()
+    started = time.perf_counter()
+    await save_message(conversation_id, "user", message)
+    history = await get_history(conversation_id)
+    
+    # Start retrieval now so it overlaps routing (incl. the router's LLM fallback)
+    retrieval = start_retrieval(message)
+    agent_type = None
+    full_response = ""
+    leader = False
     
     try:
-        while True:
-            data = await websocket.receive_json()
-            message = data.get("message", "")
-            conversation_id = data.get("conversation_id")
-            visitor_id = data.get("visitor_id", f"anon_{uuid.uuid4().hex[:8]}")
-            user_id = data.get("user_id")
-            
-            if not message:
-                continue
-            
-            print(f"📩 Query: {message[:50]}...")
-            
-            conversation_id = get_or_create_conversation(conversation_id, visitor_id)
-            save_message(conversation_id, "user", message)
-            history = get_history(conversation_id)
-            
-            # Route
+        # Route - an unexpected router failure still ends in a reply and "complete"
+        try:
             agent_type, routing_msg = await router_agent.classify(message)
             agent_desc = router_agent.get_agent_description(agent_type)
             print(f"🎯 Routed to: {agent_type}")
             
-            await websocket.send_json({
+            await writer.send_json({
                 "type": "routing",
                 "conversation_id": conversation_id,
                 "agent_type": agent_type,
                 "agent_description": agent_desc,
                 "message": routing_msg
             })
-            
-            # Stream response
-            full_response = ""
+            routed = True
+        except (SlowConsumerError, ConnectionLostError):
+            raise
+        except Exception as e:
+            print(f"❌ Routing error: {e}")
+            count_error("routing")
+            import traceback
+            traceback.print_exc()
+            routed = False
+        
+        if not routed:
+            writer.start_reply()
+            full_response = TURN_ERROR_MESSAGE
+            await writer.write(full_response, agent_type)
+        else:
+            # Stream response (coalesced into fewer frames by the writer)
+            writer.start_reply()
             
             try:
-                if agent_type == "ticket":
-                    async for chunk in ticket_agent.stream_response(message, history, None, user_id):
-                        full_response += chunk
-                        await websocket.send_json({"type": "stream", "content": chunk, "agent_type": agent_type})
-                elif agent_type == "event":
-                    async for chunk in event_agent.stream_response(message, history, None):
-                        full_response += chunk
-                        await websocket.send_json({"type": "stream", "content": chunk, "agent_type": agent_type})
-                elif agent_type == "account":
-                    async for chunk in account_agent.stream_response(message, history, None, user_id):
-                        full_response += chunk
-                        await websocket.send_json({"type": "stream", "content": chunk, "agent_type": agent_type})
-                else:  # FAQ
-                    async for chunk in faq_agent.stream_response(message, history):
+                def generate():
+                    # Only called if no identical turn is generating - the flight takes the retrieval
+                    nonlocal leader
+                    leader = True
+                    return generate_reply(agent_type, message, history, user_id, retrieval)
+                
+                # Joins an identical in-flight generation if there is one. aclosing: cancelling
+                # the turn unsubscribes, and the LLM stream stops once nobody is listening
+                async with aclosing(single_flight.stream(flight_key(agent_type, message), generate)) as stream:
+                    async for chunk in stream:
                         full_response += chunk
-                        await websocket.send_json({"type": "stream", "content": chunk, "agent_type": agent_type})
+                        await writer.write(chunk, agent_type)
+                writer.flush()
                 
-                print(f"✅ Response generated ({len(full_response)} chars)")
-                        
+                print(f"✅ Response generated ({len(full_response)} chars, {writer.frames_sent} frames sent)")
+            
+            except (SlowConsumerError, ConnectionLostError, asyncio.CancelledError):
+                raise
             except Exception as e:
                 print(f"❌ Agent error: {e}")
+                count_error("agent")
                 import traceback
                 traceback.print_exc()
-                full_response = f"Sorry, I encountered an issue. Please try again."
-                await websocket.send_json({"type": "stream", "content": full_response, "agent_type": agent_type})
+                # Never tack an apology onto text the client already has
+                suffix = STREAM_INTERRUPTED if full_response else TURN_ERROR_MESSAGE
+                full_response += suffix
+                await writer.write(suffix, agent_type)
+    
+    except asyncio.CancelledError:
+        print(f"⏹️ Turn cancelled ({len(full_response)} chars streamed)")
+        if full_response:
+            await save_message(conversation_id, "assistant", full_response, agent_type)
+        try:
+            await writer.send_json({"type": "cancelled", "conversation_id": conversation_id, "agent_type": agent_type})
+        except Exception:
+            pass  # Connection already gone
+        raise
+    except ConnectionLostError as e:
+        # Socket is gone - the receive loop sees the disconnect; nothing left to send
+        print(f"🔌 Turn ended, connection lost: {e}")
+        if full_response:
+            await save_message(conversation_id, "assistant", full_response, agent_type)
+        return
+    except SlowConsumerError as e:
+        print(f"🐢 Dropping slow client: {e}")
+        # Kept like any other interrupted reply, so history doesn't depend on how the client failed
+        if full_response:
+            await save_message(conversation_id, "assistant", full_response, agent_type)
+        try:
+            await writer.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+        return
+    finally:
+        # Followers and turns cancelled before generating never read the context
+        if retrieval and not leader:
+            retrieval.cancel()
+        TURN_SECONDS.observe(time.perf_counter() - started, agent_type or "unrouted")
+    
+    await save_message(conversation_id, "assistant", full_response, agent_type)
+    await writer.send_json({"type": "complete", "conversation_id": conversation_id, "agent_type": agent_type})
+
+
+@app.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket):
+    await websocket.accept()
+    connection_id = str(uuid.uuid4())
+    print(f"🔌 Connected: {connection_id}")
+    
+    # Bounded outbound buffer - agents never wait on a slow client
+    writer = StreamWriter(websocket, frame_cache, connection_id=connection_id)
+    OPEN_WEBSOCKETS.inc()
+    # Turns run as tasks so a follow-up can supersede (or queue behind) the current one
+    turns = TurnScheduler()
+    
+    try:
+        while True:
+            data = await websocket.receive_json()
+            message = data.get("message", "")
+            conversation_id = data.get("conversation_id")
+            visitor_id = data.get("visitor_id", f"anon_{uuid.uuid4().hex[:8]}")
+            user_id = data.get("user_id")
+            
+            if not message:
+                continue
+            
+            print(f"📩 Query: {message[:50]}...")
             
-            save_message(conversation_id, "assistant", full_response, agent_type)
-            await websocket.send_json({"type": "complete", "conversation_id": conversation_id, "agent_type": agent_type})
+            conversation_id = await get_or_create_conversation(conversation_id, visitor_id)
+            if data.get("turn_policy"):
+                turns.set_policy(conversation_id, data["turn_policy"])
+            turns.submit(conversation_id, lambda m=message, c=conversation_id, u=user_id: run_turn(writer, m, c, u))
     
     except WebSocketDisconnect:
         print(f"🔌 Disconnected: {connection_id}")
     except Exception as e:
         print(f"❌ WebSocket error: {e}")
+        count_error("websocket")
+    finally:
+        # Nobody is listening any more - stop generating
+        await turns.cancel_all()
+        await writer.aclose()
+        OPEN_WEBSOCKETS.dec()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+# Metrics - lightweight in-process latency tracking
+# Rolling windows per agent, summarized under /health, plus Prometheus-style
+# histograms/counters/gauges rendered in the text exposition format at
+# /metrics (no client library needed - everything here is single-process).
+
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Tuple, TypeVar
+import bisect
+import threading
+import time
+
+T = TypeVar("T")
+
+WINDOW_SIZE = 1000
+
+
+class LatencyWindow:
+    """Last N observations (seconds) with percentile summary"""
+
+    def __init__(self, size: int = WINDOW_SIZE):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self) -> Dict:
+        if not self.samples:
+            return {"count": self.count}
+        ordered = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+
+        return {"count": self.count, "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
+
+
+# LLM time-to-first-token, per agent
+_ttft: Dict[str, LatencyWindow] = {}
+
+
+def observe_ttft(agent: str, seconds: float):
+    _ttft.setdefault(agent, LatencyWindow()).observe(seconds)
+    LLM_TTFT_SECONDS.observe(seconds, agent)
+
+
+async def track_ttft(agent: str, stream: AsyncIterator[T], started: Optional[float] = None) -> AsyncIterator[T]:
+    """Pass a token stream through, recording time to its first item"""
+    started = started if started is not None else time.perf_counter()
+    first = True
+    async for item in stream:
+        if first:
+            observe_ttft(agent, time.perf_counter() - started)
+            first = False
+        yield item
+
+
+def ttft_summary() -> Dict:
+    return {agent: window.summary() for agent, window in sorted(_ttft.items())}
+
+
+# -- Prometheus exposition --
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()  # Observed from executor threads too
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Set directly, or read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float] = None):
+        super().__init__(name, help)
+        self._value = 0.0
+        self._read = read
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        self._value = value
+
+    def _samples(self) -> List[str]:
+        try:
+            value = self._read() if self._read else self._value
+        except Exception:
+            return []
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, seconds: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            series[1] += seconds
+
+    def time(self, *label_values: str) -> "_Timer":
+        return _Timer(self, label_values)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.labels + ("le",), key + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    """with HISTOGRAM.time(...): - observes the block's duration"""
+
+    def __init__(self, histogram: Histogram, label_values: Tuple[str, ...]):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+ROUTE_SECONDS = Histogram("support_route_seconds", "Time to pick an agent", ("source",))
+RETRIEVAL_SECONDS = Histogram("support_retrieval_seconds", "Vector search (embedding + lookup) per batch")
+EMBEDDING_SECONDS = Histogram("support_embedding_seconds", "Embedding model calls (cache misses only)")
+LLM_TTFT_SECONDS = Histogram("support_llm_ttft_seconds", "LLM time to first token", ("agent",))
+TURN_SECONDS = Histogram("support_turn_seconds", "Whole chat turn, message to complete", ("agent",))
+
+ROUTES_TOTAL = Counter("support_routes_total", "Routing decisions by source", ("source", "agent"))
+ANSWERS_TOTAL = Counter(
+    "support_answers_total",
+    "Replies by the layer that produced them (exact_cache, semantic_cache, extractive, llm, llm_partial, fallback)",
+    ("agent", "layer"),
+)
+ERRORS_TOTAL = Counter("support_errors_total", "Errors by stage", ("stage",))
+
+OPEN_WEBSOCKETS = Gauge("support_open_websockets", "Connected chat WebSockets")
+
+
+def count_answer(agent: str, layer: str):
+    ANSWERS_TOTAL.inc(agent, layer)
+
+
+def count_error(stage: str):
+    ERRORS_TOTAL.inc(stage)
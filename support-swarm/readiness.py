@@ -0,0 +1,47 @@
+# Readiness - per-component startup state behind /ready
+# /health answers as soon as the process is up; /ready only once the
+# required components have finished warming up in the background.
+
+from typing import Dict
+import time
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+DISABLED = "disabled"
+
+
+class Readiness:
+    """Tracks startup state of each component"""
+
+    def __init__(self):
+        self._started = time.monotonic()
+        self._components: Dict[str, Dict] = {}
+
+    def register(self, name: str, required: bool = True):
+        self._components[name] = {"state": PENDING, "required": required}
+
+    def set(self, name: str, state: str, **detail):
+        component = self._components.setdefault(name, {"required": False})
+        component.update(detail)
+        component["state"] = state
+        if state in (READY, FAILED):
+            component["after_seconds"] = round(time.monotonic() - self._started, 2)
+        if state == FAILED:
+            print(f"[Startup] {name} failed: {detail.get('error')}")
+        elif state == READY:
+            print(f"[Startup] {name} ready ({component['after_seconds']}s)")
+
+    def is_ready(self) -> bool:
+        return all(
+            c["state"] in (READY, DISABLED)
+            for c in self._components.values()
+            if c["required"]
+        )
+
+    def snapshot(self) -> Dict:
+        return {"ready": self.is_ready(), "components": {k: dict(v) for k, v in self._components.items()}}
+
+
+readiness = Readiness()
@@ -0,0 +1,180 @@
+# Retrieval Backends - where VectorStore keeps and searches document vectors
+# RAG_BACKEND=numpy  exact search over one contiguous float32 matrix (default)
+# RAG_BACKEND=chroma ChromaDB in-memory collection
+# Both return squared-L2 distances, so search()/get_context() thresholds match.
+
+from typing import Dict, List, Optional
+import os
+
+import numpy as np
+
+RAG_BACKEND = os.getenv("RAG_BACKEND", "numpy").lower()
+
+
+class RetrievalBackend:
+    """Interface for vector search engines used by VectorStore"""
+
+    name = "base"
+
+    def upsert(self, docs: List[dict], embeddings) -> None:
+        raise NotImplementedError
+
+    def query(self, query_embeddings, n_results: int, category: Optional[str] = None) -> List[List[dict]]:
+        """Top-n docs per query as {"id", "content", "category", "distance"}"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+
+class NumpyBackend(RetrievalBackend):
+    """Exact top-k via one batched matmul - no extra dependencies"""
+
+    name = "numpy"
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.contents: List[str] = []
+        self.categories: List[str] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._category_masks: Dict[str, np.ndarray] = {}
+
+    def upsert(self, docs: List[dict], embeddings) -> None:
+        new = np.asarray(embeddings, dtype=np.float32)
+        positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+        if not self.ids:
+            # First load - keep the (possibly memory-mapped) matrix as-is
+            self.matrix = new if new.flags.c_contiguous else np.ascontiguousarray(new)
+            self.ids = [doc["id"] for doc in docs]
+            self.contents = [doc["content"] for doc in docs]
+            self.categories = [doc["category"] for doc in docs]
+        else:
+            matrix = np.array(self.matrix, dtype=np.float32)  # writable copy
+            appended = []
+            for doc, row in zip(docs, new):
+                i = positions.get(doc["id"])
+                if i is None:
+                    appended.append(row)
+                    self.ids.append(doc["id"])
+                    self.contents.append(doc["content"])
+                    self.categories.append(doc["category"])
+                else:
+                    matrix[i] = row
+                    self.contents[i] = doc["content"]
+                    self.categories[i] = doc["category"]
+            if appended:
+                matrix = np.concatenate([matrix, np.stack(appended)])
+            self.matrix = np.ascontiguousarray(matrix)
+
+        self._sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self._category_masks = {
+            category: np.array([c == category for c in self.categories])
+            for category in set(self.categories)
+        }
+
+    def query(self, query_embeddings, n_results: int, category: Optional[str] = None) -> List[List[dict]]:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if not self.ids:
+            return [[] for _ in range(len(queries))]
+
+        # ||q - d||² = ||q||² + ||d||² - 2 q·d, for every (query, doc) pair at once
+        distances = (
+            np.einsum("ij,ij->i", queries, queries)[:, None]
+            + self._sq_norms[None, :]
+            - 2.0 * (queries @ self.matrix.T)
+        )
+        np.maximum(distances, 0.0, out=distances)
+
+        if category is not None:
+            mask = self._category_masks.get(category)
+            if mask is None:
+                return [[] for _ in range(len(queries))]
+            distances[:, ~mask] = np.inf
+            n_results = min(n_results, int(mask.sum()))
+
+        k = min(n_results, len(self.ids))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, candidates in enumerate(top):
+            order = candidates[np.argsort(distances[row, candidates], kind="stable")]
+            results.append([
+                {
+                    "id": self.ids[i],
+                    "content": self.contents[i],
+                    "category": self.categories[i],
+                    "distance": float(distances[row, i]),
+                }
+                for i in order
+            ])
+        return results
+
+    def count(self) -> int:
+        return len(self.ids)
+
+
+class ChromaBackend(RetrievalBackend):
+    """ChromaDB in-memory collection (imported only when selected)"""
+
+    name = "chroma"
+
+    def __init__(self, collection_name: str = "fanfirst_knowledge"):
+        import chromadb
+
+        self.client = chromadb.Client()
+        # We always supply embeddings ourselves
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=None,
+            metadata={"description": "FanFirst support knowledge base"}
+        )
+
+    def upsert(self, docs: List[dict], embeddings) -> None:
+        self.collection.upsert(
+            ids=[doc["id"] for doc in docs],
+            documents=[doc["content"] for doc in docs],
+            embeddings=[list(map(float, row)) for row in embeddings],
+            metadatas=[{"category": doc["category"], "keywords": ",".join(doc["keywords"])} for doc in docs],
+        )
+
+    def query(self, query_embeddings, n_results: int, category: Optional[str] = None) -> List[List[dict]]:
+        results = self.collection.query(
+            query_embeddings=[list(map(float, row)) for row in query_embeddings],
+            n_results=n_results,
+            where={"category": category} if category else None,
+            include=["documents", "metadatas", "distances"]
+        )
+
+        batch = []
+        for q in range(len(query_embeddings)):
+            docs = []
+            if results and results["documents"]:
+                for i, doc in enumerate(results["documents"][q]):
+                    docs.append({
+                        "id": results["ids"][q][i],
+                        "content": doc,
+                        "category": results["metadatas"][q][i]["category"],
+                        "distance": results["distances"][q][i] if results["distances"] else 0
+                    })
+            batch.append(docs)
+        return batch
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+BACKENDS = {
+    NumpyBackend.name: NumpyBackend,
+    ChromaBackend.name: ChromaBackend,
+}
+
+
+def create_backend(name: str = None, **options) -> RetrievalBackend:
+    name = (name or RAG_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown RAG_BACKEND '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](**options)
@@ -0,0 +1,125 @@
+# Semantic Response Cache - reuse LLM answers for paraphrased questions
+# Keyed on the query embedding, scoped per agent type + knowledge base version.
+
+from typing import Dict, List, Optional, Tuple
+import os
+import time
+
+import numpy as np
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+
+
+class _Scope:
+    """Fixed-size slot table for one (agent_type, kb_version)"""
+
+    def __init__(self, size: int, dim: int):
+        self.vectors = np.zeros((size, dim), dtype=np.float32)
+        self.expires = np.zeros(size, dtype=np.float64)  # 0 = empty slot
+        self.last_used = np.zeros(size, dtype=np.float64)
+        self.answers: List[Optional[str]] = [None] * size
+
+
+class SemanticCache:
+    """Cosine-similarity answer cache with TTL and LRU eviction"""
+
+    def __init__(
+        self,
+        vector_store,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        size: int = SEMANTIC_CACHE_SIZE,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS,
+    ):
+        self.vector_store = vector_store
+        self.threshold = threshold
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self._scopes: Dict[Tuple[str, int], _Scope] = {}
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _scope(self, agent_type: str, dim: int, create: bool) -> Optional[_Scope]:
+        key = (agent_type, self.vector_store.kb_version)
+        scope = self._scopes.get(key)
+        if scope is None and create:
+            # Answers from an older knowledge base are never reused - drop them
+            for old in [k for k in self._scopes if k[0] == agent_type]:
+                del self._scopes[old]
+            scope = self._scopes[key] = _Scope(self.size, dim)
+        return scope
+
+    def lookup(self, agent_type: str, embedding) -> Optional[str]:
+        query = self._unit(embedding)
+        scope = self._scope(agent_type, len(query), create=False)
+
+        answer = None
+        if scope is not None:
+            now = time.monotonic()
+            sims = scope.vectors @ query
+            sims[scope.expires <= now] = -1.0
+            best = int(sims.argmax())
+            if sims[best] >= self.threshold:
+                scope.last_used[best] = now
+                answer = scope.answers[best]
+
+        counter = self.hits if answer is not None else self.misses
+        counter[agent_type] = counter.get(agent_type, 0) + 1
+        return answer
+
+    def store(self, agent_type: str, embedding, answer: str):
+        vector = self._unit(embedding)
+        scope = self._scope(agent_type, len(vector), create=True)
+        now = time.monotonic()
+
+        # Reuse an expired/empty slot first, else evict the least recently used
+        expired = np.flatnonzero(scope.expires <= now)
+        slot = int(expired[0]) if len(expired) else int(scope.last_used.argmin())
+
+        scope.vectors[slot] = vector
+        scope.expires[slot] = now + self.ttl_seconds
+        scope.last_used[slot] = now
+        scope.answers[slot] = answer
+
+    async def alookup(self, agent_type: str, message: str) -> Optional[str]:
+        return self.lookup(agent_type, await self.vector_store.aembed(message))
+
+    async def astore(self, agent_type: str, message: str, answer: str):
+        if answer.strip():
+            self.store(agent_type, await self.vector_store.aembed(message), answer)
+
+    def stats(self) -> Dict:
+        agents = set(self.hits) | set(self.misses)
+        by_agent = {}
+        for agent in sorted(agents):
+            hits, misses = self.hits.get(agent, 0), self.misses.get(agent, 0)
+            by_agent[agent] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            }
+        return {
+            "threshold": self.threshold,
+            "entries": sum(int((s.expires > time.monotonic()).sum()) for s in self._scopes.values()),
+            "agents": by_agent,
+        }
+
+
+# Global instance
+_semantic_cache = None
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Get or create semantic cache singleton - None until the vector store is warm"""
+    global _semantic_cache
+    if _semantic_cache is None:
+        from vector_store import get_ready_vector_store
+        vector_store = get_ready_vector_store()
+        if vector_store is not None:
+            _semantic_cache = SemanticCache(vector_store)
+    return _semantic_cache
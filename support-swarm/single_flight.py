@@ -0,0 +1,96 @@
+# Single Flight - identical in-flight questions share one generation
+# During an on-sale hundreds of users ask the same uncached question within
+# seconds. The first turn for a key starts the agent's generator in its own
+# task; identical turns arriving while it runs subscribe to it, replay the
+# tokens produced so far and then follow the live stream. The generation is
+# cancelled only when every subscriber has gone.
+
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional
+import asyncio
+
+
+class _Flight:
+    """One shared generation and the tokens it has produced so far"""
+    __slots__ = ("chunks", "done", "error", "subscribers", "updated", "task")
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.updated = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        # Swap in a fresh event so every waiter wakes exactly once
+        updated, self.updated = self.updated, asyncio.Event()
+        updated.set()
+
+
+class SingleFlight:
+    """Coalesces concurrent streams with the same key"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def stream(self, key: Hashable, start: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Yield the stream for key - start() is only called if nobody is generating it"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._generate(key, flight, start()))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        flight.subscribers += 1
+        try:
+            sent = 0
+            while True:
+                updated = flight.updated
+                while sent < len(flight.chunks):
+                    yield flight.chunks[sent]
+                    sent += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await updated.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Last listener left - stop the upstream work
+                flight.task.cancel()
+                self._release(key, flight)
+
+    async def _generate(self, key: Hashable, flight: _Flight, stream: AsyncIterator[str]):
+        try:
+            async for chunk in stream:
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            await stream.aclose()
+            flight.done = True
+            self._release(key, flight)
+            flight.notify()
+
+    def _release(self, key: Hashable, flight: _Flight):
+        # Later identical questions start fresh (and hit the semantic cache)
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_rate": round(self.followers / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,294 @@
+# Stream Writer - per-connection outbound buffer for streamed replies
+# Generation and delivery are decoupled: agents write into a bounded buffer and
+# never wait on the socket, while a sender task drains it. The first chunk of
+# a reply goes out at once (TTFT), the rest is batched until
+# STREAM_FLUSH_BYTES / STREAM_FLUSH_MS. Cached answers go out as frames
+# encoded once at startup.
+#
+# Slow consumers (STREAM_SLOW_POLICY):
+#   coalesce   - frames waiting behind a slow send are merged into one, so a
+#                lagging client costs one frame's overhead, not hundreds
+#   disconnect - frames are queued as-is
+# Under either policy a client is dropped (which also cancels its generation)
+# once more than STREAM_BUFFER_BYTES is queued for it, or once its oldest
+# undelivered frame is older than STREAM_MAX_LAG_SECONDS. Connections lagging
+# by more than STREAM_LAG_WARN_SECONDS are counted and listed in /health.
+
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import os
+import time
+import weakref
+
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", "30"))
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", "512"))
+STREAM_BUFFER_BYTES = int(os.getenv("STREAM_BUFFER_BYTES", "65536"))
+STREAM_MAX_LAG_SECONDS = float(os.getenv("STREAM_MAX_LAG_SECONDS", "10"))
+STREAM_SLOW_POLICY = os.getenv("STREAM_SLOW_POLICY", "coalesce").lower()
+STREAM_LAG_WARN_SECONDS = float(os.getenv("STREAM_LAG_WARN_SECONDS", "1"))
+SLOWEST_REPORTED = 5
+
+# Close code for dropped slow consumers ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+_STREAM = "stream"
+_RAW = "raw"
+
+
+def encode_stream_frame(content: str, agent_type: str) -> str:
+    return json.dumps({"type": "stream", "content": content, "agent_type": agent_type}, ensure_ascii=False)
+
+
+class SlowConsumerError(Exception):
+    """Client is too far behind - the connection should be dropped"""
+
+
+class ConnectionLostError(Exception):
+    """A send failed - the socket is gone and nothing more can be delivered"""
+
+
+class FrameCache:
+    """Pre-serialized stream frames for fixed (cached) answers"""
+
+    def __init__(self, responses: Iterable[Tuple[str, str]] = ()):
+        self._frames: Dict[Tuple[str, str], str] = {}
+        for agent_type, text in responses:
+            self._frames[(agent_type, text)] = encode_stream_frame(text, agent_type)
+
+    def get(self, agent_type: str, text: str) -> Optional[str]:
+        return self._frames.get((agent_type, text))
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+class _Frame:
+    """Queued outbound frame - stream frames can absorb later stream text"""
+    __slots__ = ("kind", "agent_type", "payload", "nbytes", "enqueued_at")
+
+    def __init__(self, kind: str, agent_type: Optional[str], payload: str):
+        self.kind = kind
+        self.agent_type = agent_type
+        self.payload = payload
+        self.nbytes = len(payload.encode("utf-8"))
+        self.enqueued_at = time.monotonic()
+
+
+# Live writers, for the /health lag summary
+_writers: "weakref.WeakSet[StreamWriter]" = weakref.WeakSet()
+slow_consumer_drops = 0
+
+
+class StreamWriter:
+    """Bounded outbound buffer + sender task for one WebSocket"""
+
+    def __init__(
+        self,
+        websocket,
+        frames: FrameCache = None,
+        policy: str = STREAM_SLOW_POLICY,
+        connection_id: Optional[str] = None,
+    ):
+        self.websocket = websocket
+        self.connection_id = connection_id
+        self.frames = frames or FrameCache()
+        self.policy = policy
+
+        # Chunks not yet turned into a frame (time/byte batching)
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._pending_agent: Optional[str] = None
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._reply_started = False
+
+        # Frames waiting for the sender
+        self._queue: Deque[_Frame] = deque()
+        self._queued_bytes = 0
+        self._has_frames = asyncio.Event()
+        self._sending_since: Optional[float] = None
+        self._closing = False
+        self._error: Optional[BaseException] = None
+        self._sender = asyncio.create_task(self._run())
+
+        # Per-connection metrics
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.chunks_in = 0
+        self.coalesced = 0
+        self.max_lag = 0.0
+        _writers.add(self)
+
+    # -- producer side (never waits on the socket) --
+
+    def start_reply(self):
+        """Next chunk begins a new reply and is sent without batching delay"""
+        self._reply_started = False
+
+    async def write(self, chunk: str, agent_type: str):
+        if not chunk:
+            return
+        self.check()
+        self.chunks_in += 1
+
+        frame = self.frames.get(agent_type, chunk)
+        if frame is not None:
+            self.flush()
+            self._enqueue(_Frame(_RAW, agent_type, frame))
+            return
+
+        if self._pending and self._pending_agent != agent_type:
+            self.flush()
+        self._pending.append(chunk)
+        self._pending_bytes += len(chunk.encode("utf-8"))
+        self._pending_agent = agent_type
+
+        if not self._reply_started or self._pending_bytes >= STREAM_FLUSH_BYTES:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(STREAM_FLUSH_MS / 1000, self.flush)
+
+    async def send_json(self, data: dict):
+        """Control frame (routing/complete) - ordered after any pending text"""
+        self.check()
+        self.flush()
+        self._enqueue(_Frame(_RAW, None, json.dumps(data, ensure_ascii=False)))
+
+    def flush(self):
+        """Turn batched chunks into a queued frame"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        content = "".join(self._pending)
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._reply_started = True
+        self._enqueue(_Frame(_STREAM, self._pending_agent, content))
+
+    def _enqueue(self, frame: _Frame):
+        tail = self._queue[-1] if self._queue else None
+        if (
+            self.policy == "coalesce"
+            and frame.kind == _STREAM
+            and tail is not None
+            and tail.kind == _STREAM
+            and tail.agent_type == frame.agent_type
+        ):
+            # Sender is behind - grow the waiting frame instead of adding one
+            tail.payload += frame.payload
+            tail.nbytes += frame.nbytes
+            self.coalesced += 1
+        else:
+            self._queue.append(frame)
+        self._queued_bytes += frame.nbytes
+        self._has_frames.set()
+
+    def lag(self) -> float:
+        """Age of the oldest undelivered frame, including one stuck mid-send (seconds)"""
+        oldest = self._sending_since
+        if self._queue:
+            head = self._queue[0].enqueued_at
+            oldest = head if oldest is None else min(oldest, head)
+        return time.monotonic() - oldest if oldest is not None else 0.0
+
+    def check(self):
+        """Raise if the client can't keep up (or the socket already failed)"""
+        global slow_consumer_drops
+        if self._error is not None:
+            raise self._error
+        lag = self.lag()
+        self.max_lag = max(self.max_lag, lag)
+        # Coalescing saves frames, not bytes - the buffer cap applies to both policies
+        if lag > STREAM_MAX_LAG_SECONDS or self._queued_bytes > STREAM_BUFFER_BYTES:
+            slow_consumer_drops += 1
+            self._error = SlowConsumerError(
+                f"lag {lag:.1f}s, {self._queued_bytes} bytes queued (policy={self.policy})"
+            )
+            raise self._error
+
+    async def aclose(self):
+        """Stop the sender (queued frames are discarded)"""
+        self._closing = True
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._sender.cancel()
+        try:
+            await self._sender
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    # -- sender side --
+
+    async def _run(self):
+        try:
+            while not self._closing:
+                if not self._queue:
+                    self._has_frames.clear()
+                    await self._has_frames.wait()
+                    continue
+                # Detach before awaiting so nothing coalesces into a frame mid-send
+                frame = self._queue.popleft()
+                self._queued_bytes -= frame.nbytes
+                self._sending_since = frame.enqueued_at
+                text = frame.payload if frame.kind == _RAW else encode_stream_frame(frame.payload, frame.agent_type)
+                await self.websocket.send_text(text)
+                self._sending_since = None
+                self.max_lag = max(self.max_lag, time.monotonic() - frame.enqueued_at)
+                self.frames_sent += 1
+                self.bytes_sent += frame.nbytes
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = ConnectionLostError(f"send failed: {e!r}")
+            self._error.__cause__ = e
+            # Nothing queued can be delivered now - don't report it as lag
+            self._queue.clear()
+            self._queued_bytes = 0
+            self._sending_since = None
+
+    def stats(self) -> Dict:
+        return {
+            "id": self.connection_id,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "chunks_in": self.chunks_in,
+            "coalesced": self.coalesced,
+            "queued_bytes": self._queued_bytes,
+            "lag_ms": round(self.lag() * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+        }
+
+
+def lagging_connections() -> int:
+    """Open connections currently behind by more than STREAM_LAG_WARN_SECONDS"""
+    return sum(1 for w in list(_writers) if w.lag() > STREAM_LAG_WARN_SECONDS)
+
+
+def max_stream_lag() -> float:
+    return max((w.lag() for w in list(_writers)), default=0.0)
+
+
+def connection_stats() -> Dict:
+    """Lag and traffic summary across open connections, with the slowest listed"""
+    per_writer = [w.stats() for w in list(_writers)]
+    slowest = sorted(per_writer, key=lambda s: s["lag_ms"], reverse=True)[:SLOWEST_REPORTED]
+    return {
+        "open": len(per_writer),
+        "policy": STREAM_SLOW_POLICY,
+        "buffer_bytes": STREAM_BUFFER_BYTES,
+        "slow_consumer_drops": slow_consumer_drops,
+        "lag_warn_ms": round(STREAM_LAG_WARN_SECONDS * 1000, 1),
+        "lagging": sum(1 for s in per_writer if s["lag_ms"] > STREAM_LAG_WARN_SECONDS * 1000),
+        "slowest": [
+            {"id": s["id"], "lag_ms": s["lag_ms"], "queued_bytes": s["queued_bytes"]}
+            for s in slowest if s["lag_ms"] > 0 or s["queued_bytes"] > 0
+        ],
+        "max_lag_ms": max((s["lag_ms"] for s in per_writer), default=0.0),
+        "queued_bytes": sum(s["queued_bytes"] for s in per_writer),
+        "frames_sent": sum(s["frames_sent"] for s in per_writer),
+        "chunks_in": sum(s["chunks_in"] for s in per_writer),
+        "coalesced": sum(s["coalesced"] for s in per_writer),
+    }
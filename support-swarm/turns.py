@@ -0,0 +1,85 @@
+# Turns - per-conversation scheduling of chat turns on one WebSocket
+# Each turn runs as its own task so the socket keeps reading while a reply
+# streams. When a new message arrives for a conversation that still has a
+# turn in flight (TURN_POLICY, or "turn_policy" on the message):
+#   cancel - the previous turn is cancelled (its LLM/RAG work with it)
+#   queue  - the new turn waits for the previous one to finish
+# Closing the connection cancels every turn still running.
+
+from typing import Awaitable, Callable, Dict
+import asyncio
+import os
+
+CANCEL = "cancel"
+QUEUE = "queue"
+POLICIES = (CANCEL, QUEUE)
+
+TURN_POLICY = os.getenv("TURN_POLICY", CANCEL).lower()
+if TURN_POLICY not in POLICIES:
+    TURN_POLICY = CANCEL
+
+# Process-wide counters, for /health
+_stats = {"started": 0, "completed": 0, "superseded": 0, "queued": 0, "disconnected": 0}
+
+
+class TurnScheduler:
+    """Runs turns as tasks, one chain per conversation"""
+
+    def __init__(self, default_policy: str = TURN_POLICY):
+        self.default_policy = default_policy
+        self._policies: Dict[str, str] = {}
+        self._latest: Dict[str, asyncio.Task] = {}
+        self._tasks = set()
+
+    def set_policy(self, conversation_id: str, policy: str):
+        if policy in POLICIES:
+            self._policies[conversation_id] = policy
+
+    def policy(self, conversation_id: str) -> str:
+        return self._policies.get(conversation_id, self.default_policy)
+
+    def submit(self, conversation_id: str, run: Callable[[], Awaitable]) -> asyncio.Task:
+        """Schedule a turn - run() is only called once earlier turns are out of the way"""
+        previous = self._latest.get(conversation_id)
+        if previous is not None and previous.done():
+            previous = None
+        if previous is not None:
+            if self.policy(conversation_id) == CANCEL:
+                previous.cancel()
+                _stats["superseded"] += 1
+            else:
+                _stats["queued"] += 1
+
+        task = asyncio.create_task(self._run(previous, run))
+        self._latest[conversation_id] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._finished(conversation_id, t))
+        return task
+
+    async def _run(self, previous, run):
+        if previous is not None:
+            # Wait (without propagating our own cancellation) so replies never interleave
+            await asyncio.wait({previous})
+        _stats["started"] += 1
+        await run()
+        _stats["completed"] += 1
+
+    def _finished(self, conversation_id: str, task: asyncio.Task):
+        self._tasks.discard(task)
+        if self._latest.get(conversation_id) is task:
+            del self._latest[conversation_id]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Turn error: {task.exception()}")
+
+    async def cancel_all(self):
+        """Connection closed - stop every pending/running turn and wait for cleanup"""
+        tasks = [t for t in self._tasks if not t.done()]
+        for task in tasks:
+            task.cancel()
+        _stats["disconnected"] += len(tasks)
+        if tasks:
+            await asyncio.wait(tasks)
+
+
+def turn_stats() -> Dict:
+    return {"policy": TURN_POLICY, **_stats}
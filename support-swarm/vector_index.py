@@ -0,0 +1,99 @@
+# Persistent Vector Index - precomputed knowledge base embeddings on disk
+# Layout of RAG_INDEX_DIR:
+#   embeddings.npy  float32 matrix, one row per document (loaded memory-mapped)
+#   meta.json       format version, KB content hash, model name, document ids
+# The index is reused only when the KB hash and embedding model both match.
+
+from typing import List, Optional
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+INDEX_FORMAT_VERSION = 1
+
+_EMBEDDINGS_FILE = "embeddings.npy"
+_META_FILE = "meta.json"
+
+
+def kb_hash(docs: List[dict], model_name: str) -> str:
+    """Content hash of the knowledge base + embedding model"""
+    payload = json.dumps(
+        {"version": INDEX_FORMAT_VERSION, "model": model_name, "docs": docs},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_index(index_dir: str, docs: List[dict], model_name: str) -> Optional[np.ndarray]:
+    """Memory-mapped embeddings if the on-disk index is current, else None"""
+    try:
+        with open(os.path.join(index_dir, _META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get("kb_hash") != kb_hash(docs, model_name):
+        print(f"[RAG] Index at {index_dir} is stale - re-embedding")
+        return None
+
+    try:
+        embeddings = np.load(os.path.join(index_dir, _EMBEDDINGS_FILE), mmap_mode="r")
+    except (OSError, ValueError) as e:
+        print(f"[RAG] Index load failed: {e}")
+        return None
+
+    if embeddings.shape[0] != len(docs) or meta.get("ids") != [doc["id"] for doc in docs]:
+        return None
+
+    print(f"[RAG] Loaded precomputed index ({embeddings.shape[0]} x {embeddings.shape[1]}) from {index_dir}")
+    return embeddings
+
+
+def save_index(index_dir: str, docs: List[dict], model_name: str, embeddings) -> np.ndarray:
+    """Write the index atomically; returns the float32 matrix"""
+    matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+    meta = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "kb_hash": kb_hash(docs, model_name),
+        "model": model_name,
+        "ids": [doc["id"] for doc in docs],
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+    }
+
+    tmp_paths = []
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        # Write per-process temp files then rename, so a crash or another worker
+        # building the same index never leaves a half or mixed index
+        fd, tmp_embeddings = tempfile.mkstemp(prefix=f".{_EMBEDDINGS_FILE}.", suffix=".tmp", dir=index_dir)
+        tmp_paths.append(tmp_embeddings)
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, matrix)
+            f.flush()
+            os.fsync(f.fileno())
+        fd, tmp_meta = tempfile.mkstemp(prefix=f".{_META_FILE}.", suffix=".tmp", dir=index_dir)
+        tmp_paths.append(tmp_meta)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Meta goes last: it only ever points at complete embeddings
+        os.replace(tmp_embeddings, os.path.join(index_dir, _EMBEDDINGS_FILE))
+        os.replace(tmp_meta, os.path.join(index_dir, _META_FILE))
+        tmp_paths.clear()
+        print(f"[RAG] Saved index ({len(docs)} docs) to {index_dir}")
+    except OSError as e:
+        # Read-only filesystem etc. - still usable, just not persisted
+        print(f"[RAG] Index save failed: {e}")
+    finally:
+        for path in tmp_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    return matrix
@@ -1,9 +1,32 @@
-# RAG Vector Store with ChromaDB
-# Stores FanFirst knowledge base for semantic search
+# RAG Vector Store
+# Stores FanFirst knowledge base for semantic search (backend: retrieval_backends.py)
 
-import chromadb
-from chromadb.utils import embedding_functions
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Hashable, List, Optional, Tuple
+import asyncio
 import os
+import re
+import threading
+import time
+
+from retrieval_backends import create_backend
+from embedding_server import EMBEDDING_SOCKET, RemoteEmbedder
+from vector_index import load_index, save_index
+from metrics import EMBEDDING_SECONDS, RETRIEVAL_SECONDS
+
+# Embedding model + on-disk index (re-embedded only when the KB hash changes)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")  # Fast, good quality
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rag_index"))
+
+# Async retrieval tuning - concurrent lookups within the window share one query
+RAG_WORKERS = int(os.getenv("RAG_WORKERS", "1"))
+RAG_BATCH_WINDOW_MS = float(os.getenv("RAG_BATCH_WINDOW_MS", "5"))
+RAG_MAX_BATCH = int(os.getenv("RAG_MAX_BATCH", "32"))
+
+# Query cache - popular questions skip re-embedding and re-querying
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "2048"))
+RAG_CACHE_TTL_SECONDS = float(os.getenv("RAG_CACHE_TTL_SECONDS", "600"))
 
 # FanFirst Knowledge Base Documents
 KNOWLEDGE_BASE = [
@@ -151,67 +174,291 @@ KNOWLEDGE_BASE = [
 ]
 
 
+def normalize_query(query: str) -> str:
+    """Canonical cache key: lowercase, collapsed whitespace, no trailing punctuation"""
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?!.,; ")
+
+
+class LRUCache:
+    """Thread-safe LRU cache with TTL and hit-rate stats"""
+    
+    def __init__(self, maxsize: int = RAG_CACHE_SIZE, ttl_seconds: float = RAG_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable, count_miss: bool = True) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += count_miss
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class QueryBatcher:
+    """Micro-batches concurrent searches into one backend query"""
+    
+    def __init__(self, store: "VectorStore"):
+        self.store = store
+        self._pending: List[Tuple[str, int, asyncio.Future]] = []
+        self._flush_handle = None
+        self._tasks = set()
+        self.batches = 0
+        self.queries = 0
+    
+    async def search(self, query: str, n_results: int) -> list[dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, n_results, future))
+        
+        if len(self._pending) >= RAG_MAX_BATCH:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(RAG_BATCH_WINDOW_MS / 1000, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        # Drop lookups whose caller already gave up (e.g. a cancelled turn)
+        pending = [p for p in self._pending if not p[2].done()]
+        self._pending = []
+        if pending:
+            task = asyncio.ensure_future(self._run(pending))
+            self._tasks.add(task)  # Hold a reference until it finishes
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, pending: List[Tuple[str, int, asyncio.Future]]):
+        queries = [query for query, _, _ in pending]
+        n_max = max(n for _, n, _ in pending)
+        self.batches += 1
+        self.queries += len(queries)
+        
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(
+                self.store.executor, self.store.search_batch, queries, n_max
+            )
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, n, future), docs in zip(pending, results):
+            if not future.done():  # Caller may have been cancelled
+                future.set_result(docs[:n])
+
+
+class RetrievalContext:
+    """One turn's retrieval, started before routing and shared with the agent"""
+    
+    def __init__(self, store: "VectorStore", query: str, max_tokens: int = 1000):
+        self.query = query
+        self._task = asyncio.ensure_future(store.aget_passages(query, max_tokens))
+        self._task.add_done_callback(self._consume_error)
+    
+    @staticmethod
+    def _consume_error(task: asyncio.Task):
+        # Failures surface through get(); avoid "exception never retrieved" noise
+        if not task.cancelled():
+            task.exception()
+    
+    async def get(self) -> Tuple[list, str]:
+        """Wait for (passages, context string) - raises if retrieval failed"""
+        return await asyncio.shield(self._task)
+    
+    def done(self) -> bool:
+        return self._task.done()
+    
+    def cancel(self):
+        """Abandon the lookup when the turn no longer needs it"""
+        if not self._task.done():
+            self._task.cancel()
+
+
+class SentenceTransformerEmbedder:
+    """Callable texts → vectors (same encode call Chroma's embedding function makes)"""
+    
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+    
+    def __call__(self, texts: List[str]):
+        return self.model.encode(list(texts), convert_to_numpy=True, normalize_embeddings=False)
+
+
 class VectorStore:
-    """ChromaDB vector store for RAG"""
+    """Vector store for RAG over a pluggable search backend"""
     
-    def __init__(self):
-        # Use sentence-transformers for embeddings (free, local)
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"  # Fast, good quality
-        )
+    def __init__(self, backend: str = None):
+        # Sentence-transformers model is loaded on first embed, not at boot -
+        # a current on-disk index means startup never needs it
+        self._embedding_fn = None
+        self._embedding_lock = threading.Lock()
         
-        # In-memory ChromaDB
-        self.client = chromadb.Client()
+        # numpy (exact, default) or chroma - see RAG_BACKEND
+        self.backend = create_backend(backend)
         
-        # Create collection
-        self.collection = self.client.get_or_create_collection(
-            name="fanfirst_knowledge",
-            embedding_function=self.embedding_fn,
-            metadata={"description": "FanFirst support knowledge base"}
-        )
+        # Dedicated executor so embedding + lookup never runs on the event loop
+        self.executor = ThreadPoolExecutor(max_workers=RAG_WORKERS, thread_name_prefix="rag")
+        self._batcher = QueryBatcher(self)
+        
+        # Caches keyed on normalized query; kb_version bumps invalidate them
+        self.kb_version = 0
+        self._embedding_cache = LRUCache()
+        self._context_cache = LRUCache()
         
         # Load knowledge base
         self._load_knowledge_base()
-        print(f"[RAG] Loaded {self.collection.count()} documents into vector store")
+        print(f"[RAG] Loaded {self.count()} documents into {self.backend.name} vector store")
     
     def _load_knowledge_base(self):
-        """Load all documents into ChromaDB"""
-        if self.collection.count() > 0:
+        """Load all documents into the backend"""
+        if self.count() > 0:
             return  # Already loaded
         
-        ids = [doc["id"] for doc in KNOWLEDGE_BASE]
-        documents = [doc["content"] for doc in KNOWLEDGE_BASE]
-        metadatas = [{"category": doc["category"], "keywords": ",".join(doc["keywords"])} for doc in KNOWLEDGE_BASE]
-        
-        self.collection.add(
-            ids=ids,
-            documents=documents,
-            metadatas=metadatas
-        )
-    
-    def search(self, query: str, n_results: int = 3) -> list[dict]:
-        """Search for relevant documents"""
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            include=["documents", "metadatas", "distances"]
-        )
-        
-        docs = []
-        if results and results["documents"]:
-            for i, doc in enumerate(results["documents"][0]):
-                docs.append({
-                    "content": doc,
-                    "category": results["metadatas"][0][i]["category"],
-                    "distance": results["distances"][0][i] if results["distances"] else 0
-                })
-        
-        return docs
+        embeddings = load_index(RAG_INDEX_DIR, KNOWLEDGE_BASE, EMBEDDING_MODEL)
+        if embeddings is None:
+            embeddings = save_index(
+                RAG_INDEX_DIR,
+                KNOWLEDGE_BASE,
+                EMBEDDING_MODEL,
+                self.embedding_fn([doc["content"] for doc in KNOWLEDGE_BASE]),
+            )
+        
+        self.add_documents(KNOWLEDGE_BASE, embeddings)
+    
+    @property
+    def embedding_fn(self):
+        if self._embedding_fn is None:
+            with self._embedding_lock:
+                if self._embedding_fn is None:
+                    if EMBEDDING_SOCKET:
+                        # Shared model in embedding_server.py - local copy only as fallback
+                        self._embedding_fn = RemoteEmbedder(
+                            EMBEDDING_SOCKET,
+                            fallback=lambda: SentenceTransformerEmbedder(EMBEDDING_MODEL),
+                            model_name=EMBEDDING_MODEL,
+                        )
+                    else:
+                        # Use sentence-transformers for embeddings (free, local)
+                        self._embedding_fn = SentenceTransformerEmbedder(EMBEDDING_MODEL)
+        return self._embedding_fn
+    
+    def add_documents(self, docs: list[dict], embeddings=None):
+        """Add or replace knowledge base documents (invalidates caches)"""
+        if embeddings is None:
+            embeddings = self.embedding_fn([doc["content"] for doc in docs])
+        
+        self.backend.upsert(docs, embeddings)
+        self.invalidate_cache()
+    
+    def count(self) -> int:
+        return self.backend.count()
+    
+    def invalidate_cache(self):
+        """Drop cached retrieval results after a knowledge base change"""
+        self.kb_version += 1
+        self._context_cache.clear()
+    
+    def embed(self, queries: List[str]) -> list:
+        """Embed queries, reusing cached vectors for normalized repeats"""
+        keys = [normalize_query(q) for q in queries]
+        embeddings = [self._embedding_cache.get(key) for key in keys]
+        
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        if missing:
+            with EMBEDDING_SECONDS.time():
+                fresh = self.embedding_fn([keys[i] for i in missing])
+            for i, emb in zip(missing, fresh):
+                embeddings[i] = emb
+                self._embedding_cache.set(keys[i], emb)
+        
+        return embeddings
+    
+    async def aembed(self, query: str):
+        """Embedding for one query - cached vectors skip the executor hop"""
+        cached = self._embedding_cache.get(normalize_query(query), count_miss=False)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        return (await loop.run_in_executor(self.executor, self.embed, [query]))[0]
+    
+    def search_batch(self, queries: List[str], n_results: int = 3, category: str = None) -> list[list[dict]]:
+        """Search for several queries in one embedding + lookup pass"""
+        with RETRIEVAL_SECONDS.time():
+            return self.backend.query(self.embed(queries), n_results, category)
+    
+    def search(self, query: str, n_results: int = 3, category: str = None) -> list[dict]:
+        """Search for relevant documents (optionally within one category)"""
+        return self.search_batch([query], n_results, category)[0]
     
     def get_context(self, query: str, max_tokens: int = 1000) -> str:
         """Get formatted context for LLM"""
-        docs = self.search(query, n_results=3)
-        
+        key = (normalize_query(query), max_tokens, self.kb_version)
+        entry = self._context_cache.get(key)
+        if entry is None:
+            docs = self.search(query, n_results=3)
+            entry = (docs, self.format_context(docs, max_tokens))
+            self._context_cache.set(key, entry)
+        return entry[1]
+    
+    async def asearch(self, query: str, n_results: int = 3) -> list[dict]:
+        """Search off the event loop, batched with concurrent callers"""
+        return await self._batcher.search(query, n_results)
+    
+    async def aget_passages(self, query: str, max_tokens: int = 1000) -> Tuple[list, str]:
+        """(top passages, formatted context) - the passages feed extractive answers"""
+        key = (normalize_query(query), max_tokens, self.kb_version)
+        entry = self._context_cache.get(key)
+        if entry is None:
+            docs = await self.asearch(query, n_results=3)
+            entry = (docs, self.format_context(docs, max_tokens))
+            self._context_cache.set(key, entry)
+        return entry
+    
+    async def aget_context(self, query: str, max_tokens: int = 1000) -> str:
+        """Async get_context"""
+        return (await self.aget_passages(query, max_tokens))[1]
+    
+    def start_retrieval(self, query: str, max_tokens: int = 1000) -> RetrievalContext:
+        """Kick off aget_passages in the background for this turn"""
+        return RetrievalContext(self, query, max_tokens)
+    
+    @staticmethod
+    def format_context(docs: list[dict], max_tokens: int = 1000) -> str:
         if not docs:
             return ""
         
@@ -222,10 +469,22 @@ class VectorStore:
                 context_parts.append(f"[{doc['category'].upper()}]: {doc['content']}")
         
         return "\n\n".join(context_parts)[:max_tokens]
+    
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "batches": self._batcher.batches,
+            "queries": self._batcher.queries,
+            "kb_version": self.kb_version,
+            "embedding_server": self._embedding_fn.stats() if isinstance(self._embedding_fn, RemoteEmbedder) else None,
+            "embedding_cache": self._embedding_cache.stats(),
+            "context_cache": self._context_cache.stats(),
+        }
 
 
 # Global instance
 _vector_store = None
+_vector_store_ready = False
 
 def get_vector_store() -> VectorStore:
     """Get or create vector store singleton"""
@@ -233,3 +492,22 @@ def get_vector_store() -> VectorStore:
     if _vector_store is None:
         _vector_store = VectorStore()
     return _vector_store
+
+
+def warm_up_vector_store() -> VectorStore:
+    """Build the store and load the embedding model (blocking - run off the loop)"""
+    global _vector_store_ready
+    vs = get_vector_store()
+    vs.embedding_fn(["warm up"])
+    _vector_store_ready = True
+    return vs
+
+
+def get_ready_vector_store() -> Optional[VectorStore]:
+    """Vector store once warm-up has finished, else None (callers degrade)"""
+    return _vector_store if _vector_store_ready else None
+
+
+if __name__ == "__main__":
+    # Prebuild the on-disk index (e.g. at image build time)
+    warm_up_vector_store()